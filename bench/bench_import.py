@@ -0,0 +1,33 @@
+# Measures `import diagen` time in fresh interpreters and checks it against a budget.
+# The first run writes the bytecode cache, so source compilation is not counted,
+# as for an installed package.
+#
+#   python bench/bench_import.py [budget_ms]
+import os
+import subprocess
+import sys
+
+RUNS = 10
+BUDGET_MS = 60.0
+CODE = 'import time; t = time.perf_counter(); import diagen; print(time.perf_counter() - t)'
+ENV = {k: v for k, v in os.environ.items() if k != 'PYTHONDONTWRITEBYTECODE'}
+
+
+def measure() -> float:
+    out = subprocess.run(
+        [sys.executable, '-c', CODE], env=ENV, capture_output=True, text=True, check=True
+    )
+    return float(out.stdout) * 1000
+
+
+def main() -> None:
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else BUDGET_MS
+    measure()
+    best = min(measure() for _ in range(RUNS))
+    print(f'import diagen: {best:.1f} ms (budget {budget:.0f} ms)')
+    if best > budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
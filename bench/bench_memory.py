@@ -0,0 +1,50 @@
+# Reports memory per node of a built and arranged diagram.
+#
+#   python bench/bench_memory.py [nodes]
+import gc
+import sys
+import tracemalloc
+from typing import Callable, TypeVar
+
+from diagen import edge, grid, node, wrap
+from diagen.layouts import LayoutNode, arrange
+from diagen.nodes import Node
+
+T = TypeVar('T')
+
+ROW = 100
+
+
+def build(count: int) -> Node:
+    rows = []
+    for r in range(count // ROW):
+        items = [node() for _ in range(ROW)]
+        for s, t in zip(items, items[1:]):
+            edge(s.r, t.l)
+        rows.append(grid['dv'](*items))
+    return wrap(rows)
+
+
+def measure(fn: Callable[[], T]) -> tuple[T, int]:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = fn()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    root, tree_bytes = measure(lambda: build(count))
+    layout, layout_bytes = measure(lambda: arrange(root))
+    print(f'nodes: {count}, edges: {count - count // ROW}')
+    print(f'tree    {tree_bytes / count:8.1f} bytes/node')
+    print(f'layout  {layout_bytes / count:8.1f} bytes/node')
+    assert isinstance(layout, LayoutNode)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# Compares generated props code with generic dataclasses.replace based path.
+#
+#   python bench/bench_props.py
+import timeit
+from dataclasses import replace
+from typing import Any, Callable
+
+from diagen import styles
+from diagen.props import NodeProps, eval_node_props, merge_node_props
+from diagen.stylemap import NodeKeys, StyleMap, intern_style
+
+NUMBER = 20000
+CLASSES = 'p-1 px-2 gap-4 size-24/12 align-center grid-cols-3'
+
+
+def replace_eval_node_props(props: NodeProps) -> NodeProps:
+    m = props.scale
+    s = props.size
+    g = props.gap
+    p = props.padding
+    return replace(
+        props,
+        size=(s[0] * m if s[0] is not None else None, s[1] * m if s[1] is not None else None),
+        gap=(g[0] * m, g[1] * m),
+        padding=(p[0] * m, p[1] * m, p[2] * m, p[3] * m),
+    )
+
+
+def generic_stylemap() -> StyleMap[NodeProps, NodeKeys]:
+    result = StyleMap[NodeProps, NodeKeys](styles.node.default_props())
+    result.update(styles.node._styles)
+    result.add_rules(styles.node._rules)
+    return result
+
+
+def run(name: str, fn: Callable[[], object]) -> float:
+    elapsed = min(timeit.repeat(fn, number=NUMBER, repeat=5))
+    print(f'{name:<24} {elapsed / NUMBER * 1e6:8.2f} us')
+    return elapsed
+
+
+def main() -> None:
+    props = styles.node.resolve_classes(CLASSES)
+    data: NodeKeys = {'padding': (1, 2, 3, 4), 'gap': (4, 4), 'link': 'x'}
+    changes: dict[str, Any] = dict(data)
+    style = intern_style({'html': 1})
+    generic = generic_stylemap()
+    classes = CLASSES.split()
+
+    print('merge')
+    base = run('  dataclass replace', lambda: replace(props, **changes, drawio_style=style))
+    fast = run('  generated', lambda: merge_node_props(props, data, style))
+    print(f'  speedup {base / fast:.2f}x')
+
+    print('eval_node_props')
+    base = run('  dataclass replace', lambda: replace_eval_node_props(props))
+    fast = run('  generated', lambda: eval_node_props(props))
+    print(f'  speedup {base / fast:.2f}x')
+
+    print(f'resolve {CLASSES!r}')
+    base = run('  dataclass replace', lambda: generic._resolve_classes(classes, props))
+    fast = run('  generated', lambda: styles.node._resolve_classes(classes, props))
+    print(f'  speedup {base / fast:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
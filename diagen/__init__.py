@@ -1,9 +1,9 @@
 from typing import Collection
 
 from . import styles
-from .nodes import EdgeFactory, Node, NodeFactory, node_context
+from .nodes import Diagram, EdgeFactory, Node, NodeFactory, node_context
 
-__all__ = ['node_context', 'wrap']
+__all__ = ['Diagram', 'node_context', 'wrap']
 
 base_node = NodeFactory(styles.node)
 grid = base_node['virtual']
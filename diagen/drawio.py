@@ -1,15 +1,33 @@
 import base64
+import codecs
+import hashlib
 import xml.etree.ElementTree as ET
 import zlib
-from collections import namedtuple
+from collections import ChainMap, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from copy import copy
+from dataclasses import dataclass, field, replace
+from functools import partial
 from itertools import count
-from typing import Literal
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Hashable,
+    Iterable,
+    Iterator,
+    Literal,
+    Mapping,
+    MutableMapping,
+    Union,
+)
 from urllib import parse
 
 from . import base_node
-from .layouts import LayoutNode, arrange, node_map, walk
-from .nodes import Edge, Node, Port
-from .stylemap import BackendStyle, NodeKeys
+from .layouts import LayoutNode, Pin, arrange, layout_tree, node_map, rwalk, walk
+from .layouts.tiles import split_tiles
+from .nodes import AnyEdgePort, Edge, Node, Port
+from .stylemap import BackendStyle, EdgeProps, NodeKeys, NodeProps, Style, StyleDict, style_key
 from .utils import dtup2
 
 element = namedtuple('element', 'tag attrs children')
@@ -17,40 +35,276 @@ element = namedtuple('element', 'tag attrs children')
 CONSTRAINT = ['west', 'north', 'east', 'south']
 
 
+MODEL_DEFAULTS = {
+    'arrows': '1',
+    'connect': '1',
+    'fold': '0',
+    'grid': '1',
+    'gridSize': '10',
+    'guides': '1',
+    'math': '0',
+    'page': '1',
+    'pageScale': '1',
+    'tooltips': '1',
+}
+
+# attributes and style values drawio assumes when they are missing
+IMPLICIT_MODEL_ATTRS = {
+    'arrows': '1',
+    'connect': '1',
+    'grid': '1',
+    'gridSize': '10',
+    'guides': '1',
+    'math': '0',
+    'page': '1',
+    'pageScale': '1',
+    'tooltips': '1',
+}
+IMPLICIT_STYLE = {'dashed': '0', 'shadow': '0'}
+
+B36_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
 def style_to_str(style: BackendStyle) -> str:
     if not style:
         return ''
     return ';'.join(f'{k}={v}' for k, v in style.items())
 
 
-def port_style(port: Port, kind: Literal['source'] | Literal['target']) -> BackendStyle:
+def compact_style_to_str(style: BackendStyle) -> str:
+    return ';'.join(
+        f'{k}={v}' for k, v in style.items() if (sv := str(v)) != '' and IMPLICIT_STYLE.get(k) != sv
+    )
+
+
+def base36(value: int) -> str:
+    result = ''
+    while True:
+        value, d = divmod(value, 36)
+        result = B36_DIGITS[d] + result
+        if not value:
+            return result
+
+
+def port_style(port: Port, kind: Literal['source'] | Literal['target']) -> StyleDict:
     return {f'{kind}PortConstraint': CONSTRAINT[port.side]}
 
 
+def port_anchor(edge: Edge, port: Port, kind: Literal['exit'] | Literal['entry']) -> StyleDict:
+    pos = port.node.edge_positions[port.side][edge]
+    side = port.side
+    if side in (0, 2):
+        x, y = side / 2, pos
+    else:
+        x, y = pos, (side - 1) / 2
+    return {f'{kind}X': x, f'{kind}Y': y}
+
+
+def content_id(*parts: str) -> str:
+    digest = hashlib.blake2b('\0'.join(parts).encode(), digest_size=8).digest()
+    return base36(int.from_bytes(digest))
+
+
+def unique_id(key: str, seen: set[str]) -> str:
+    result = key
+    idx = 0
+    while result in seen:
+        idx += 1
+        result = f'{key}-{idx}'
+    seen.add(result)
+    return result
+
+
+def port_key(port: AnyEdgePort) -> str:
+    if isinstance(port, Port):
+        return f'{port.side}/{port.index}/{port.position}'
+    return ''
+
+
+Fragment = tuple[Union['Fragment', str], ...]
+
+
+def flatten(fragment: Fragment) -> Iterator[str]:
+    for it in fragment:
+        if isinstance(it, str):
+            yield it
+        else:
+            yield from flatten(it)
+
+
+def cached_style_str(style: BackendStyle, kind: Hashable, fn: Callable[[BackendStyle], str]) -> str:
+    if type(style) is not Style:
+        return fn(style)
+
+    try:
+        return style.strings[kind]
+    except KeyError:
+        pass
+
+    result = style.strings[kind] = fn(style)
+    return result
+
+
+class RenderCache:
+    # labels shared between pages of a single render
+
+    def __init__(self) -> None:
+        self.labels: dict[Hashable, tuple[NodeProps | EdgeProps, str]] = {}
+
+    def label(self, owner: Node | Edge) -> str:
+        props = owner.props
+        key = id(props), tuple(owner.label)
+        try:
+            cached_props, result = self.labels[key]
+            if cached_props is props:
+                return result
+        except KeyError:
+            pass
+
+        result = owner.get_label()
+        self.labels[key] = props, result
+        return result
+
+
+@dataclass(frozen=True, eq=False)
+class Theme:
+    # Style value replacements by style key, `*` entries apply to any key.
+    # Compared by identity. Serialized interned styles are memoized on the
+    # theme, so they are released together with it.
+    name: str
+    remap: Mapping[str, Mapping[str, str]]
+    strings: dict[tuple[str, Style], str] = field(default_factory=dict, repr=False)
+
+    def style_str(self, style: BackendStyle, kind: str, fn: Callable[[BackendStyle], str]) -> str:
+        if type(style) is not Style:
+            return fn(self.apply(style))
+
+        key = kind, style
+        try:
+            return self.strings[key]
+        except KeyError:
+            pass
+
+        result = self.strings[key] = fn(self.apply(style))
+        return result
+
+    def apply(self, style: BackendStyle) -> BackendStyle:
+        result: StyleDict | None = None
+        fallback = self.remap.get('*')
+        for k, v in style.items():
+            if type(v) is not str:
+                continue
+            m = self.remap.get(k)
+            new = m.get(v) if m else None
+            if new is None and fallback:
+                new = fallback.get(v)
+            if new is not None and new != v:
+                if result is None:
+                    result = dict(style)
+                result[k] = new
+        return style if result is None else result
+
+
+@dataclass(frozen=True, kw_only=True)
+class RenderOptions:
+    # vertex: invisible 3x3 cell per port, anchor: exit/entry edge constraints
+    ports: Literal['vertex'] | Literal['anchor'] = 'vertex'
+
+    # short ids, no empty/implicit attributes and style keys
+    compact: bool = False
+    # number of decimal digits to keep in geometry
+    precision: int | None = None
+    # round node positions to grid_size
+    snap: bool = False
+    grid_size: int = 10
+
+    # ids derived from labels and tree path instead of a walk counter
+    stable_ids: bool = False
+
+    # geometry of previously rendered cells, matching nodes keep their position and size
+    pinned: Mapping[str, 'CellGeometry'] | None = None
+
+    # style values remapped during serialization
+    theme: Theme | None = None
+
+
+DEFAULT_OPTIONS = RenderOptions()
+COMPACT_OPTIONS = RenderOptions(ports='anchor', compact=True, precision=1)
+
+
 class JGraph:
-    def __init__(self, root: LayoutNode) -> None:
+    root: LayoutNode
+    edges: list[Edge]
+    ids: MutableMapping[Node | Edge, str]
+
+    def __init__(
+        self,
+        root: LayoutNode,
+        options: RenderOptions = DEFAULT_OPTIONS,
+        memo: 'RenderCache | None' = None,
+    ) -> None:
         self.node_map = node_map(root)
+        self.options = options
+        self.memo = memo or RenderCache()
+        self.prepare(root)
 
-    def make_geom(self, node: LayoutNode) -> element:
+    def num(self, value: float, snap: bool = False) -> str:
+        o = self.options
+        if snap and o.snap:
+            value = round(value / o.grid_size) * o.grid_size
+        elif o.precision is not None:
+            value = round(value, o.precision)
+        else:
+            return str(value)
+
+        if value == int(value):
+            return str(int(value))
+        return str(value)
+
+    def style(self, style: BackendStyle) -> str:
+        if self.options.compact:
+            kind, fn = 'compact', compact_style_to_str
+        else:
+            kind, fn = 'full', style_to_str
+
+        if (theme := self.options.theme) is None:
+            return cached_style_str(style, kind, fn)
+        return theme.style_str(style, kind, fn)
+
+    def themed(self, theme: Theme | None) -> 'JGraph':
+        # same arranged graph and ids, only serialized styles differ
+        result = copy(self)
+        result.options = replace(self.options, theme=theme)
+        return result
+
+    def parent_position(self, node: LayoutNode) -> tuple[float, float]:
+        return node.real_parent.position
+
+    def make_geom(self, node: LayoutNode, snap: bool = True) -> element:
         p = node.position
-        pp = node.real_parent.position
+        pp = self.parent_position(node)
         x, y = p[0] - pp[0], p[1] - pp[1]
         w, h = node.size
-        return element(
-            'mxGeometry',
-            {'as': 'geometry', 'x': str(x), 'y': str(y), 'width': str(w), 'height': str(h)},
-            [],
-        )
+        attrs = {'as': 'geometry'}
+        if not (self.options.compact and x == 0):
+            attrs['x'] = self.num(x, snap)
+        if not (self.options.compact and y == 0):
+            attrs['y'] = self.num(y, snap)
+        attrs['width'] = self.num(w)
+        attrs['height'] = self.num(h)
+        return element('mxGeometry', attrs, [])
 
     def node_element(self, node: LayoutNode) -> element:
         attrs = {
-            'id': node.node.id,
-            'parent': node.real_parent.node.id,
+            'id': self.ids[node.node],
+            'parent': self.ids[node.real_parent.node],
             'vertex': '1',
-            'style': style_to_str(node.props.drawio_style),
         }
 
-        if label := node.node.get_label():
+        if (style := self.style(node.props.drawio_style)) or not self.options.compact:
+            attrs['style'] = style
+
+        if label := self.memo.label(node.node):
             attrs['value'] = label
 
         if node.props.link:
@@ -64,8 +318,8 @@ class JGraph:
         node = port.node
         o = [1, 0][axis]
         attrs = {
-            'id': edge.id + '-' + node.id,
-            'parent': node.id,
+            'id': self.ids[edge] + '-' + self.ids[node],
+            'parent': self.ids[node],
             'vertex': '1',
             'style': 'container=0;fillColor=none;strokeColor=none',
         }
@@ -75,7 +329,7 @@ class JGraph:
         ac = origin[axis] + offset[0] * lnode.size[axis] - 1.5
         oc = origin[o] + offset[1] + (lnode.size[o] - 3) / 2.0 * (align + 1)
         lport_node = LayoutNode(lnode, port_node, port_node.props, [], position=dtup2(axis, ac, oc))
-        return element('mxCell', attrs, [self.make_geom(lport_node)])
+        return element('mxCell', attrs, [self.make_geom(lport_node, False)])
 
     def arrange_port(self, edge: Edge, port: Port) -> element:
         edges = port.node.edge_positions[port.side]
@@ -88,34 +342,52 @@ class JGraph:
         geom = element('mxGeometry', {'as': 'geometry', 'relative': '1'}, [])
         attrs = {
             'edge': '1',
-            'id': edge.id,
-            'parent': self.node_map[edge.source.node_ref].real_parent.node.id,
-            'source': self.node_map[edge.source.node_ref].node.id,
-            'target': self.node_map[edge.target.node_ref].node.id,
+            'id': self.ids[edge],
+            'parent': self.ids[self.node_map[edge.source.node_ref].real_parent.node],
+            'source': self.ids.get(edge.source.node_ref, ''),
+            'target': self.ids.get(edge.target.node_ref, ''),
         }
 
-        if label := edge.get_label():
+        if label := self.memo.label(edge):
             attrs['value'] = label
 
-        style = edge.props.drawio_style.copy()
+        style = edge.props.drawio_style
+        port_styles: StyleDict = {}
 
         result: list[element | None] = []
 
+        port_vertices = self.options.ports == 'vertex'
+
         if isinstance(edge.source, Port):
-            style.update(port_style(edge.source, 'source'))
-            result.append(el := self.arrange_port(edge, edge.source))
-            attrs['source'] = el.attrs['id']
+            port_styles.update(port_style(edge.source, 'source'))
+            if port_vertices:
+                result.append(el := self.arrange_port(edge, edge.source))
+                attrs['source'] = el.attrs['id']
+            else:
+                port_styles.update(port_anchor(edge, edge.source, 'exit'))
 
         if isinstance(edge.target, Port):
-            style.update(port_style(edge.target, 'target'))
-            result.append(el := self.arrange_port(edge, edge.target))
-            attrs['target'] = el.attrs['id']
+            port_styles.update(port_style(edge.target, 'target'))
+            if port_vertices:
+                result.append(el := self.arrange_port(edge, edge.target))
+                attrs['target'] = el.attrs['id']
+            else:
+                port_styles.update(port_anchor(edge, edge.target, 'entry'))
+
+        if not port_styles:
+            style_str = self.style(style)
+        elif style.keys() & port_styles.keys():
+            style_str = self.style(style | port_styles)
+        else:
+            # shared style string is reused as is, port keys are appended
+            style_str = ';'.join(filter(None, (self.style(style), self.style(port_styles))))
 
-        attrs['style'] = style_to_str(style)
+        if style_str or not self.options.compact:
+            attrs['style'] = style_str
 
         if edge.props.label_offset != (0, 0):
-            geom.attrs['x'] = str(edge.props.label_offset[0])
-            geom.attrs['y'] = str(edge.props.label_offset[1])
+            geom.attrs['x'] = self.num(edge.props.label_offset[0])
+            geom.attrs['y'] = self.num(edge.props.label_offset[1])
             geom.children.append(element('mxPoint', {'as': 'offset'}, []))
 
         # if edge.points:
@@ -130,59 +402,395 @@ class JGraph:
         result.append(element('mxCell', attrs, [geom]))
         return list(filter(None, result))
 
-    @staticmethod
-    def make(node: Node) -> element:
-        node.id = '__root__'
-
-        root = element(
-            'root',
-            {},
-            [
-                element('mxCell', {'id': '0'}, []),
-                element('mxCell', {'id': node.id, 'parent': '0'}, []),
-            ],
-        )
+    def prepare(self, root: LayoutNode) -> None:
+        fmt_id: Callable[[int], str]
+        if self.options.compact:
+            # 0 and 1 are taken by root cells
+            idcounter = count(2)
+            fmt_id = base36
+        else:
+            idcounter = count()
+            fmt_id = 'diagen-{}'.format
 
-        children = []
+        stable = self.options.stable_ids
+        ids: dict[Node | Edge, str] = {root.node: '1' if self.options.compact else '__root__'}
+        # edges in order of discovery, a dict keeps emission order deterministic
+        edges: dict[Edge, None] = {}
 
-        idcounter = count()
-        edges = set()
-        layout = arrange(node)
-        jgraph = JGraph(layout)
+        seen: set[str] = set()
+        paths: dict[Node, str] = {root.node: ''}
+        for it in walk(root):
+            if stable:
+                assert it.parent
+                key = content_id(paths[it.parent.node], *it.node.label)
+                paths[it.node] = key = unique_id(key, seen)
 
-        for it in walk(layout):
             if it.props.virtual:
                 continue
-            edges.update(it.node.edges)
-            if not it.node.id:
-                it.node.id = f'diagen-{next(idcounter)}'
-            children.append(jgraph.node_element(it))
 
-        children.reverse()
+            edges.update(dict.fromkeys(it.node.edges))
+            ids[it.node] = it.node.id or (key if stable else fmt_id(next(idcounter)))
 
         for edge in edges:
-            if not edge.id:
-                edge.id = f'diagen-{next(idcounter)}'
-            children.extend(jgraph.edge_element(edge))
+            if edge.id:
+                ids[edge] = edge.id
+            elif stable:
+                key = content_id(
+                    ids.get(edge.source.node_ref, ''),
+                    port_key(edge.source),
+                    ids.get(edge.target.node_ref, ''),
+                    port_key(edge.target),
+                    *edge.label,
+                )
+                ids[edge] = unique_id(key, seen)
+            else:
+                ids[edge] = fmt_id(next(idcounter))
+
+        self.root = root
+        self.edges = list(edges)
+        self.ids = ids
+
+    def model_attrs(self) -> dict[str, str]:
+        attrs = MODEL_DEFAULTS.copy()
+        attrs['gridSize'] = str(self.options.grid_size)
+        if self.options.compact:
+            attrs = {k: v for k, v in attrs.items() if IMPLICIT_MODEL_ATTRS.get(k) != v}
+        attrs['pageWidth'] = self.num(self.root.size[0])
+        attrs['pageHeight'] = self.num(self.root.size[1])
+        return attrs
+
+    def cells(self) -> Iterator[element]:
+        yield element('mxCell', {'id': '0'}, [])
+        yield element('mxCell', {'id': self.ids[self.root.node], 'parent': '0'}, [])
+
+        for it in rwalk(self.root):
+            if not it.props.virtual:
+                yield self.node_element(it)
+
+        for edge in self.edges:
+            yield from self.edge_element(edge)
+
+    def node_key(self, node: LayoutNode) -> Hashable:
+        p = node.position
+        pp = node.real_parent.position
+        props = node.props
+        return (
+            self.ids[node.node],
+            self.ids[node.real_parent.node],
+            p[0] - pp[0],
+            p[1] - pp[1],
+            node.size,
+            style_key(props.drawio_style),
+            props.link,
+            props.label_formatter,
+            tuple(node.node.label),
+        )
+
+    def edge_key(self, edge: Edge) -> Hashable:
+        key: list[Hashable] = [
+            self.ids[edge],
+            style_key(edge.props.drawio_style),
+            edge.props.label_offset,
+            edge.props.label_formatter,
+            tuple(edge.label),
+        ]
+        for port in (edge.source, edge.target):
+            lnode = self.node_map[port.node_ref]
+            key.extend((self.ids.get(port.node_ref), self.ids[lnode.real_parent.node]))
+            key.append(lnode.position)
+            key.append(lnode.size)
+            if isinstance(port, Port):
+                key.extend((port.side, port.node.edge_positions[port.side][edge]))
+        return tuple(key)
+
+    def subtree(self, node: LayoutNode, cache: 'FragmentCache') -> tuple[int, Fragment]:
+        children = [self.subtree(it, cache) for it in reversed(node.children)]
 
-        root.children.extend(children)
+        def make() -> Fragment:
+            fragment: list[Fragment | str] = [f for _, f in children]
+            if not node.props.virtual:
+                fragment.append(''.join(serialize(self.node_element(node))))
+            return tuple(fragment)
+
+        key = (
+            None if node.props.virtual else self.node_key(node),
+            tuple(token for token, _ in children),
+        )
+        return cache.get(key, make)
+
+    def cached_cells(self, cache: 'FragmentCache') -> Iterator[str]:
+        yield from serialize(element('mxCell', {'id': '0'}, []))
+        yield from serialize(element('mxCell', {'id': self.ids[self.root.node], 'parent': '0'}, []))
+
+        for it in reversed(self.root.children):
+            yield from flatten(self.subtree(it, cache)[1])
+
+        for edge in self.edges:
+            yield from flatten(cache.get(self.edge_key(edge), partial(self.edge_fragment, edge))[1])
+
+    def edge_fragment(self, edge: Edge) -> Fragment:
+        return (''.join(s for it in self.edge_element(edge) for s in serialize(it)),)
+
+    @staticmethod
+    def make(node: Node, options: RenderOptions = DEFAULT_OPTIONS) -> element:
+        jgraph = JGraph(arrange_pinned(node, options), options)
+        root = element('root', {}, list(jgraph.cells()))
+        return element('mxGraphModel', jgraph.model_attrs(), [root])
+
+
+STUB_SIZE = (80, 30)
+STUB_GAP = 20
+STUB_STYLE: BackendStyle = {
+    'rounded': '1',
+    'dashed': '1',
+    'whiteSpace': 'wrap',
+    'html': '1',
+    'fontSize': '10',
+}
+
+
+def edge_side(lnode: LayoutNode, other: LayoutNode) -> int:
+    # side of lnode facing other node
+    p, s = lnode.position, lnode.size
+    op, os = other.position, other.size
+    dx = op[0] + os[0] / 2 - p[0] - s[0] / 2
+    dy = op[1] + os[1] / 2 - p[1] - s[1] / 2
+    if abs(dx) >= abs(dy):
+        return 2 if dx > 0 else 0
+    return 3 if dy > 0 else 1
+
+
+class TileGraph(JGraph):
+    # Renders a subset of top level cells of an arranged diagram as a separate
+    # page. Edges to other pages are replaced with link stubs.
+
+    def __init__(
+        self,
+        base: JGraph,
+        units: list[LayoutNode],
+        page: int,
+        pages: Mapping[Node, int],
+        names: list[str],
+    ) -> None:
+        self.node_map = base.node_map
+        self.options = base.options
+        self.memo = base.memo
+        self.root = base.root
+        self.ids = ChainMap({}, base.ids)
+        self.units = units
+        self.page = page
+        self.pages = pages
+        self.names = names
+
+        p = self.root.props.padding
+        if units:
+            x0 = min(it.position[0] for it in units) - p[0]
+            y0 = min(it.position[1] for it in units) - p[1]
+            x1 = max(it.position[0] + it.size[0] for it in units) + p[2]
+            y1 = max(it.position[1] + it.size[1] for it in units) + p[3]
+        else:
+            x0 = y0 = x1 = y1 = 0
+        self.origin = x0, y0
+        self.size = x1 - x0, y1 - y0
+
+        edges: dict[Edge, None] = {}
+        for unit in units:
+            for it in (unit, *walk(unit)):
+                if not it.props.virtual:
+                    edges.update(dict.fromkeys(it.node.edges))
+        self.edges = list(edges)
+
+    def parent_position(self, node: LayoutNode) -> tuple[float, float]:
+        if node.real_parent is self.root:
+            return self.origin
+        return node.real_parent.position
+
+    def model_attrs(self) -> dict[str, str]:
+        attrs = super().model_attrs()
+        attrs['pageWidth'] = self.num(self.size[0])
+        attrs['pageHeight'] = self.num(self.size[1])
+        return attrs
+
+    def stub_elements(self, edge: Edge, local: AnyEdgePort, remote: AnyEdgePort) -> list[element]:
+        page = self.pages[remote.node_ref]
+        lnode = self.node_map[local.node_ref]
+        side = (
+            local.side
+            if isinstance(local, Port)
+            else edge_side(lnode, self.node_map[remote.node_ref])
+        )
+
+        w, h = STUB_SIZE
+        p, s = lnode.position, lnode.size
+        if side in (0, 2):
+            x = p[0] - STUB_GAP - w if side == 0 else p[0] + s[0] + STUB_GAP
+            y = p[1] + (s[1] - h) / 2
+        else:
+            x = p[0] + (s[0] - w) / 2
+            y = p[1] - STUB_GAP - h if side == 1 else p[1] + s[1] + STUB_GAP
+
+        stub = base_node(
+            self.names[page],
+            props=NodeKeys(scale=1, size=STUB_SIZE, link=page_link(page), drawio_style=STUB_STYLE),
+        )
+        self.ids[stub] = stub_id = self.ids[edge] + '-link'
+        stub_el = self.node_element(LayoutNode(self.root, stub, stub.props, [], position=(x, y)))
+
+        local_id = self.ids[local.node_ref]
         attrs = {
-            'arrows': '1',
-            'connect': '1',
-            'fold': '0',
-            'grid': '1',
-            'gridSize': '10',
-            'guides': '1',
-            'math': '0',
-            'page': '1',
-            'pageScale': '1',
-            'tooltips': '1',
+            'edge': '1',
+            'id': self.ids[edge],
+            'parent': self.ids[self.root.node],
+            'source': local_id if local is edge.source else stub_id,
+            'target': stub_id if local is edge.source else local_id,
         }
-        attrs['pageWidth'] = str(layout.size[0])
-        attrs['pageHeight'] = str(layout.size[1])
-        result = element('mxGraphModel', attrs, [root])
+
+        if label := self.memo.label(edge):
+            attrs['value'] = label
+
+        style: BackendStyle = edge.props.drawio_style
+        if isinstance(local, Port):
+            kind = local is edge.source
+            style = (
+                edge.props.drawio_style
+                | port_style(local, 'source' if kind else 'target')
+                | port_anchor(edge, local, 'exit' if kind else 'entry')
+            )
+
+        if (style_str := self.style(style)) or not self.options.compact:
+            attrs['style'] = style_str
+
+        geom = element('mxGeometry', {'as': 'geometry', 'relative': '1'}, [])
+        return [stub_el, element('mxCell', attrs, [geom])]
+
+    def cells(self) -> Iterator[element]:
+        yield element('mxCell', {'id': '0'}, [])
+        yield element('mxCell', {'id': self.ids[self.root.node], 'parent': '0'}, [])
+
+        for unit in reversed(self.units):
+            for it in rwalk(unit):
+                if not it.props.virtual:
+                    yield self.node_element(it)
+            yield self.node_element(unit)
+
+        for edge in self.edges:
+            source = self.pages.get(edge.source.node_ref)
+            target = self.pages.get(edge.target.node_ref)
+            if source == target:
+                yield from self.edge_element(edge)
+            elif source == self.page and target is not None:
+                yield from self.stub_elements(edge, edge.source, edge.target)
+            elif target == self.page and source is not None:
+                yield from self.stub_elements(edge, edge.target, edge.source)
+
+
+def escape_attr(value: str) -> str:
+    if '&' in value:
+        value = value.replace('&', '&amp;')
+    if '<' in value:
+        value = value.replace('<', '&lt;')
+    if '>' in value:
+        value = value.replace('>', '&gt;')
+    if '"' in value:
+        value = value.replace('"', '&quot;')
+    if '\r' in value:
+        value = value.replace('\r', '&#13;')
+    if '\n' in value:
+        value = value.replace('\n', '&#10;')
+    if '\t' in value:
+        value = value.replace('\t', '&#09;')
+    return value
+
+
+def start_tag(tag: str, attrs: dict[str, str], empty: bool = False) -> str:
+    parts = ''.join(f' {k}="{escape_attr(v)}"' for k, v in attrs.items())
+    return f'<{tag}{parts} />' if empty else f'<{tag}{parts}>'
+
+
+def serialize(el: element) -> Iterator[str]:
+    if not el.children:
+        yield start_tag(el.tag, el.attrs, True)
+        return
+
+    yield start_tag(el.tag, el.attrs)
+    for it in el.children:
+        yield from serialize(it)
+    yield f'</{el.tag}>'
+
+
+class FragmentCache:
+    # Serialized subtrees keyed by cell content and child tokens. Fragments
+    # reference children fragments instead of copying them. Keys include cell
+    # ids, so it pays off only with stable ids.
+
+    def __init__(self) -> None:
+        self.options: RenderOptions | None = None
+        self.entries: dict[Hashable, tuple[int, Fragment]] = {}
+        self.fresh: dict[Hashable, tuple[int, Fragment]] = {}
+        self.tokens = count()
+        self.hits = 0
+        self.misses = 0
+
+    def bind(self, options: RenderOptions) -> None:
+        if self.options != options:
+            self.options = options
+            self.entries.clear()
+
+    def get(self, key: Hashable, make: Callable[[], Fragment]) -> tuple[int, Fragment]:
+        try:
+            result = self.entries[key]
+            self.hits += 1
+        except KeyError:
+            result = next(self.tokens), make()
+            self.misses += 1
+        self.fresh[key] = result
         return result
 
+    def commit(self) -> None:
+        self.entries = self.fresh
+        self.fresh = {}
+
+
+def iter_graph(jgraph: JGraph, cache: FragmentCache | None = None) -> Iterator[str]:
+    yield start_tag('mxGraphModel', jgraph.model_attrs())
+    yield '<root>'
+    if cache is None:
+        for it in jgraph.cells():
+            yield from serialize(it)
+    else:
+        cache.bind(jgraph.options)
+        yield from jgraph.cached_cells(cache)
+    yield '</root></mxGraphModel>'
+
+
+def arrange_pinned(node: Node, options: RenderOptions) -> LayoutNode:
+    pins = make_pins(node, options.pinned, options) if options.pinned else None
+    return arrange(node, pins)
+
+
+def iter_model(
+    node: Node,
+    options: RenderOptions = DEFAULT_OPTIONS,
+    cache: FragmentCache | None = None,
+    memo: RenderCache | None = None,
+) -> Iterator[str]:
+    return iter_graph(JGraph(arrange_pinned(node, options), options, memo), cache)
+
+
+def buffer_chunks(chunks: Iterable[str], size: int) -> Iterator[bytes]:
+    buf: list[str] = []
+    buf_size = 0
+    for it in chunks:
+        buf.append(it)
+        buf_size += len(it)
+        if buf_size >= size:
+            yield ''.join(buf).encode()
+            buf.clear()
+            buf_size = 0
+
+    if buf:
+        yield ''.join(buf).encode()
+
 
 def to_element_tree(el: element) -> ET.Element:
     e = ET.Element(el.tag, el.attrs)
@@ -190,27 +798,335 @@ def to_element_tree(el: element) -> ET.Element:
     return e
 
 
-def raw_deflate(data: bytes) -> bytes:
-    cobj = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+def raw_deflate(data: bytes, level: int = zlib.Z_DEFAULT_COMPRESSION) -> bytes:
+    cobj = zlib.compressobj(level, wbits=-zlib.MAX_WBITS)
     return cobj.compress(data) + cobj.flush()
 
 
+def encode_chunks(
+    chunks: Iterable[bytes], level: int = zlib.Z_DEFAULT_COMPRESSION
+) -> Iterator[bytes]:
+    cobj = zlib.compressobj(level, wbits=-zlib.MAX_WBITS)
+    rest = b''
+    for it in chunks:
+        data = rest + cobj.compress(parse.quote(it).encode('latin1'))
+        # base64 output is concatenable only for 3-byte aligned blocks
+        n = len(data) - len(data) % 3
+        if n:
+            yield base64.b64encode(data[:n])
+        rest = data[n:]
+
+    if data := rest + cobj.flush():
+        yield base64.b64encode(data)
+
+
+def unquote_chunk(data: str, decoder: codecs.IncrementalDecoder, final: bool = False) -> str:
+    return decoder.decode(parse.unquote_to_bytes(data.replace('+', ' ')), final)
+
+
+def decode_chunks(chunks: Iterable[bytes]) -> Iterator[str]:
+    dobj = zlib.decompressobj(wbits=-zlib.MAX_WBITS)
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    b64rest = b''
+    qrest = ''
+    for it in chunks:
+        data = b64rest + b''.join(it.split())
+        n = len(data) - len(data) % 4
+        b64rest = data[n:]
+
+        text = qrest + dobj.decompress(base64.b64decode(data[:n])).decode('latin1')
+        # keep incomplete percent escape for the next chunk
+        idx = text.find('%', len(text) - 2)
+        if idx >= 0:
+            text, qrest = text[:idx], text[idx:]
+        else:
+            qrest = ''
+
+        if result := unquote_chunk(text, decoder):
+            yield result
+
+    text = qrest + dobj.decompress(base64.b64decode(b64rest)).decode('latin1')
+    text += dobj.flush().decode('latin1')
+    if result := unquote_chunk(text, decoder, True):
+        yield result
+
+
 def decode(data: bytes) -> str:
-    return parse.unquote_plus(
-        zlib.decompress(base64.b64decode(data), wbits=-zlib.MAX_WBITS).decode()
-    )
+    return ''.join(decode_chunks((data,)))
+
+
+def encode(mx_graph: ET.Element, level: int = zlib.Z_DEFAULT_COMPRESSION) -> str:
+    return b''.join(encode_chunks(ET.tostringlist(mx_graph, encoding='utf-8'), level)).decode()
+
+
+@dataclass(frozen=True)
+class CellGeometry:
+    parent: str
+    x: float
+    y: float
+    width: float
+    height: float
 
 
-def encode(mx_graph: ET.Element) -> str:
-    return base64.b64encode(
-        raw_deflate(parse.quote(ET.tostring(mx_graph, encoding='utf-8')).encode('latin1'))
-    ).decode()
+GeometryIndex = dict[str, CellGeometry]
 
 
-def render(node: Node, compress: bool = True) -> str:
-    et = to_element_tree(JGraph.make(node))
-    if compress:
-        data = encode(et)
+def collect_geometry(events: Iterable[tuple[Any, ...]], result: GeometryIndex) -> None:
+    for event, el in events:
+        if event != 'end' or el.tag != 'mxCell':
+            continue
+
+        if el.get('vertex') == '1' and (geom := el.find('mxGeometry')) is not None:
+            result[el.get('id', '')] = CellGeometry(
+                el.get('parent', ''),
+                float(geom.get('x', 0)),
+                float(geom.get('y', 0)),
+                float(geom.get('width', 0)),
+                float(geom.get('height', 0)),
+            )
+        el.clear()
+
+
+def load(fp: BinaryIO, page: int | str = 0, chunk_size: int = 1 << 16) -> GeometryIndex:
+    result: GeometryIndex = {}
+    idx = -1
+    active = False
+    for event, el in ET.iterparse(fp, events=('start', 'end')):
+        if el.tag == 'diagram':
+            if event == 'start':
+                idx += 1
+                active = page == idx or page == el.get('name')
+                continue
+
+            if active and len(el) == 0 and el.text and (text := el.text.strip()):
+                data = text.encode()
+                parser: ET.XMLPullParser[ET.Element] = ET.XMLPullParser(('end',))
+                for it in decode_chunks(
+                    data[i : i + chunk_size] for i in range(0, len(data), chunk_size)
+                ):
+                    parser.feed(it)
+                    collect_geometry(parser.read_events(), result)
+                parser.close()
+                collect_geometry(parser.read_events(), result)
+
+            el.clear()
+            if active:
+                break
+        elif el.tag == 'mxGraphModel' and event == 'start' and idx < 0:
+            # plain mxGraphModel document without mxfile
+            active = page == 0
+        elif active:
+            collect_geometry(((event, el),), result)
+        elif event == 'end' and el.tag == 'mxCell':
+            # cells of skipped pages aren't kept either
+            el.clear()
+
+    return result
+
+
+def absolute_positions(index: GeometryIndex) -> dict[str, tuple[float, float]]:
+    result: dict[str, tuple[float, float]] = {}
+
+    def position(cell_id: str) -> tuple[float, float]:
+        try:
+            return result[cell_id]
+        except KeyError:
+            pass
+
+        if (g := index.get(cell_id)) is None:
+            return 0.0, 0.0
+
+        px, py = position(g.parent)
+        pos = result[cell_id] = px + g.x, py + g.y
+        return pos
+
+    for it in index:
+        position(it)
+    return result
+
+
+def make_pins(
+    node: Node, index: Mapping[str, CellGeometry], options: RenderOptions = DEFAULT_OPTIONS
+) -> dict[Node, Pin]:
+    ids = JGraph(layout_tree(node), options).ids
+    positions = absolute_positions(dict(index))
+    return {
+        it: Pin(positions[cell_id], (g.width, g.height))
+        for it, cell_id in ids.items()
+        if isinstance(it, Node) and (g := index.get(cell_id))
+    }
+
+
+Page = tuple[str, Node]
+# page name and a callable producing mxGraphModel chunks
+PageModel = tuple[str, Callable[[], Iterable[str]]]
+
+
+def diagram_head(page_id: str, name: str) -> bytes:
+    return f'<diagram id="{escape_attr(page_id)}" name="{escape_attr(name)}">'.encode()
+
+
+def page_link(page: int) -> str:
+    return f'data:page/id,page-{page}'
+
+
+def iter_mxfile(
+    models: Iterable[PageModel],
+    compress: bool = True,
+    chunk_size: int = 1 << 16,
+    level: int = zlib.Z_DEFAULT_COMPRESSION,
+    workers: int = 0,
+) -> Iterator[bytes]:
+    def page_data(model: Callable[[], Iterable[str]]) -> Iterator[bytes]:
+        chunks = buffer_chunks(model(), chunk_size)
+        if compress:
+            return encode_chunks(chunks, level)
+        return chunks
+
+    yield b'<mxfile>'
+    if compress and workers:
+        # zlib releases GIL, pages are compressed concurrently
+        models = list(models)
+        with ThreadPoolExecutor(workers) as executor:
+            results = executor.map(lambda it: b''.join(page_data(it[1])), models)
+            for i, ((name, _), data) in enumerate(zip(models, results)):
+                yield diagram_head(f'page-{i}', name)
+                yield data
+                yield b'</diagram>'
     else:
-        data = ET.tostring(et, encoding='utf-8').decode()
-    return f'<mxfile><diagram id="some-id" name="Page-1">{data}</diagram></mxfile>'
+        for i, (name, model) in enumerate(models):
+            yield diagram_head(f'page-{i}', name)
+            yield from page_data(model)
+            yield b'</diagram>'
+    yield b'</mxfile>'
+
+
+def iter_render_pages(
+    pages: Iterable[Page],
+    compress: bool = True,
+    chunk_size: int = 1 << 16,
+    level: int = zlib.Z_DEFAULT_COMPRESSION,
+    options: RenderOptions = DEFAULT_OPTIONS,
+    cache: FragmentCache | None = None,
+    workers: int = 0,
+) -> Iterator[bytes]:
+    memo = RenderCache()
+    models = ((name, partial(iter_model, node, options, cache, memo)) for name, node in pages)
+    yield from iter_mxfile(models, compress, chunk_size, level, workers)
+
+    if cache:
+        cache.commit()
+
+
+def iter_render_tiles(
+    node: Node,
+    name: str = 'Page',
+    tile_size: tuple[float, float] | None = None,
+    direction: int = 1,
+    compress: bool = True,
+    chunk_size: int = 1 << 16,
+    level: int = zlib.Z_DEFAULT_COMPRESSION,
+    options: RenderOptions = DEFAULT_OPTIONS,
+    workers: int = 0,
+) -> Iterator[bytes]:
+    base = JGraph(arrange_pinned(node, options), options)
+    tiles = split_tiles(base.root, tile_size, direction) or [[]]
+    names = [f'{name}-{i}' for i in range(1, len(tiles) + 1)]
+
+    pages: dict[Node, int] = {}
+    for i, units in enumerate(tiles):
+        for unit in units:
+            pages[unit.node] = i
+            pages.update(dict.fromkeys((it.node for it in walk(unit)), i))
+
+    def model(page: int) -> Iterator[str]:
+        return iter_graph(TileGraph(base, tiles[page], page, pages, names))
+
+    models = ((it, partial(model, i)) for i, it in enumerate(names))
+    return iter_mxfile(models, compress, chunk_size, level, workers)
+
+
+def iter_render(
+    node: Node,
+    compress: bool = True,
+    chunk_size: int = 1 << 16,
+    level: int = zlib.Z_DEFAULT_COMPRESSION,
+    options: RenderOptions = DEFAULT_OPTIONS,
+    cache: FragmentCache | None = None,
+) -> Iterator[bytes]:
+    return iter_render_pages([('Page-1', node)], compress, chunk_size, level, options, cache)
+
+
+def write_to(chunks: Iterable[bytes], fp: BinaryIO) -> int:
+    written = 0
+    for it in chunks:
+        fp.write(it)
+        written += len(it)
+    return written
+
+
+def render_to(
+    node: Node,
+    fp: BinaryIO,
+    compress: bool = True,
+    level: int = zlib.Z_DEFAULT_COMPRESSION,
+    options: RenderOptions = DEFAULT_OPTIONS,
+    cache: FragmentCache | None = None,
+) -> int:
+    return write_to(iter_render(node, compress, level=level, options=options, cache=cache), fp)
+
+
+def render(
+    node: Node,
+    compress: bool = True,
+    level: int = zlib.Z_DEFAULT_COMPRESSION,
+    options: RenderOptions = DEFAULT_OPTIONS,
+    cache: FragmentCache | None = None,
+) -> str:
+    return b''.join(iter_render(node, compress, level=level, options=options, cache=cache)).decode()
+
+
+def render_tiles(
+    node: Node,
+    name: str = 'Page',
+    tile_size: tuple[float, float] | None = None,
+    direction: int = 1,
+    compress: bool = True,
+    level: int = zlib.Z_DEFAULT_COMPRESSION,
+    options: RenderOptions = DEFAULT_OPTIONS,
+    workers: int = 0,
+) -> str:
+    chunks = iter_render_tiles(
+        node, name, tile_size, direction, compress, level=level, options=options, workers=workers
+    )
+    return b''.join(chunks).decode()
+
+
+def render_themes(
+    node: Node,
+    themes: Iterable[Theme],
+    compress: bool = True,
+    level: int = zlib.Z_DEFAULT_COMPRESSION,
+    options: RenderOptions = DEFAULT_OPTIONS,
+) -> dict[str, str]:
+    # arranged once, every theme costs only serialization
+    base = JGraph(arrange_pinned(node, options), options)
+    result = {}
+    for theme in themes:
+        models = [('Page-1', partial(iter_graph, base.themed(theme)))]
+        result[theme.name] = b''.join(iter_mxfile(models, compress, level=level)).decode()
+    return result
+
+
+def render_pages(
+    pages: Iterable[Page],
+    compress: bool = True,
+    level: int = zlib.Z_DEFAULT_COMPRESSION,
+    options: RenderOptions = DEFAULT_OPTIONS,
+    cache: FragmentCache | None = None,
+    workers: int = 0,
+) -> str:
+    chunks = iter_render_pages(
+        pages, compress, level=level, options=options, cache=cache, workers=workers
+    )
+    return b''.join(chunks).decode()
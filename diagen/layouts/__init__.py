@@ -1,39 +1,93 @@
-from dataclasses import dataclass
-from functools import cached_property
-from typing import TYPE_CHECKING, Iterator, Mapping, Optional
+import weakref
+from typing import TYPE_CHECKING, Iterator, Mapping, NamedTuple, Optional
 
 if TYPE_CHECKING:
     from ..nodes import Node
     from ..stylemap import NodeProps
+    from .grid import GridCells, SubGridCells
 
 NodeMap = Mapping['Node', 'LayoutNode']
 
 
-@dataclass
-class LayoutNode:
-    parent: Optional['LayoutNode']
-    node: 'Node'
-    props: 'NodeProps'
-    children: list['LayoutNode']
-    position: tuple[float, float] = (0, 0)
+WeakLayoutRef = Optional['weakref.ref[LayoutNode]']
+
 
-    @cached_property
+class LayoutNode:
+    # Parent links are weak references, so a dropped layout tree is freed
+    # by refcount without the cyclic GC.
+    __slots__ = (
+        'node',
+        'props',
+        'children',
+        'position',
+        '_parent',
+        '_size',
+        '_real_parent',
+        '_grid_cells',
+        '_subgrid_cells',
+        '__weakref__',
+    )
+
+    def __init__(
+        self,
+        parent: Optional['LayoutNode'],
+        node: 'Node',
+        props: 'NodeProps',
+        children: list['LayoutNode'],
+        position: tuple[float, float] = (0, 0),
+    ) -> None:
+        self.node = node
+        self.props = props
+        self.children = children
+        self.position = position
+        self._parent: WeakLayoutRef = weakref.ref(parent) if parent is not None else None
+        # computed on first access
+        self._size: tuple[float, float] | None = None
+        self._real_parent: WeakLayoutRef = None
+        # grid layout caches
+        self._grid_cells: GridCells | None = None
+        self._subgrid_cells: SubGridCells | None = None
+
+    @property
+    def parent(self) -> Optional['LayoutNode']:
+        return self._parent() if self._parent is not None else None
+
+    @property
     def size(self) -> tuple[float, float]:
-        return self.props.layout.size(self)
+        if self._size is None:
+            self._size = self.props.layout.size(self)
+        return self._size
+
+    @size.setter
+    def size(self, value: tuple[float, float]) -> None:
+        self._size = value
 
-    @cached_property
+    @property
     def real_parent(self) -> 'LayoutNode':
+        if self._real_parent is not None and (cached := self._real_parent()) is not None:
+            return cached
+
         result = self.parent
-        if result:
-            if result.props.virtual:
-                return result.real_parent
-            return result
-        raise RuntimeError('Node tree has no common non-virtual parent')  # pragma: no cover
+        if not result:
+            raise RuntimeError('Node tree has no common non-virtual parent')  # pragma: no cover
+        if result.props.virtual:
+            result = result.real_parent
+        self._real_parent = weakref.ref(result)
+        return result
 
     def __repr__(self) -> str:
         return f'LayoutNode(position={self.position}, node={self.node})'
 
 
+class Pin(NamedTuple):
+    # absolute position and optional size which override layout results
+    position: tuple[float, float]
+    size: tuple[float, float] | None = None
+
+
+PinMap = Mapping['Node', Pin]
+
+
 def _make_layout_tree(parent: LayoutNode | None, node: 'Node') -> LayoutNode:
     children: list[LayoutNode]
     result = LayoutNode(parent, node, node.props, children := [])
@@ -41,18 +95,62 @@ def _make_layout_tree(parent: LayoutNode | None, node: 'Node') -> LayoutNode:
     return result
 
 
-def _arrange(node: LayoutNode) -> None:
+def _pin_tree(node: LayoutNode, pinned: PinMap, fixed: set[int]) -> bool:
+    # returns True if node and all its descendants have pinned positions
+    result = True
+    for it in node.children:
+        result = _pin_tree(it, pinned, fixed) and result
+
+    pin = pinned.get(node.node)
+    if pin and pin.size:
+        node.size = pin.size
+
+    if not node.props.virtual:
+        result = result and pin is not None
+
+    if result:
+        fixed.add(id(node))
+    return result
+
+
+def _place(node: LayoutNode, pinned: PinMap) -> None:
+    if pin := pinned.get(node.node):
+        node.position = pin.position
+    for it in node.children:
+        _place(it, pinned)
+
+
+def _arrange(node: LayoutNode, pinned: PinMap, fixed: set[int]) -> None:
+    if id(node) in fixed:
+        _place(node, pinned)
+        return
+
+    pin = pinned.get(node.node)
+    if pin:
+        node.position = pin.position
+
     if not node.children:
         return
 
     node.props.layout.arrange(node)
+    if pin:
+        # subgrids set their own position during arrange
+        node.position = pin.position
+
     for it in node.children:
-        _arrange(it)
+        _arrange(it, pinned, fixed)
+
+
+def layout_tree(node: 'Node') -> LayoutNode:
+    return _make_layout_tree(None, node)
 
 
-def arrange(node: 'Node') -> LayoutNode:
+def arrange(node: 'Node', pinned: PinMap | None = None) -> LayoutNode:
     root = _make_layout_tree(None, node)
-    _arrange(root)
+    fixed: set[int] = set()
+    if pinned:
+        _pin_tree(root, pinned, fixed)
+    _arrange(root, pinned or {}, fixed)
     return root
 
 
@@ -62,6 +160,13 @@ def walk(node: LayoutNode) -> Iterator[LayoutNode]:
         yield from walk(it)
 
 
+def rwalk(node: LayoutNode) -> Iterator[LayoutNode]:
+    # reversed walk order, children are yielded before their parents
+    for it in reversed(node.children):
+        yield from rwalk(it)
+        yield it
+
+
 def node_map(node: LayoutNode) -> NodeMap:
     result = {it.node: it for it in walk(node)}
     result[node.node] = node
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+import weakref
 from typing import overload
 
 from ..props import Span
@@ -6,12 +6,13 @@ from ..utils import dtup2
 from . import LayoutNode
 
 
-@dataclass
-class Cell:
+class CellSpan:
     # 0-base indexes
-    start: tuple[int, int]
-    end: tuple[int, int]
-    node: LayoutNode
+    __slots__ = ('start', 'end')
+
+    def __init__(self, start: tuple[int, int], end: tuple[int, int]) -> None:
+        self.start = start
+        self.end = end
 
     @property
     def size(self) -> tuple[int, int]:
@@ -20,26 +21,55 @@ class Cell:
         return e[0] - s[0], e[1] - s[1]
 
 
-@dataclass
+class Cell(CellSpan):
+    __slots__ = ('node',)
+
+    def __init__(self, start: tuple[int, int], end: tuple[int, int], node: LayoutNode) -> None:
+        self.start = start
+        self.end = end
+        self.node = node
+
+
 class SubGrid:
-    parent: LayoutNode
-    direction: int
-    max_size: int | None
-    origin: tuple[int, int]
-    rc: tuple[dict[int, list[Cell]], dict[int, list[Cell]]]
+    __slots__ = ('parent', 'direction', 'max_size', 'origin', 'rc')
+
+    def __init__(
+        self,
+        parent: LayoutNode,
+        direction: int,
+        max_size: int | None,
+        origin: tuple[int, int],
+        rc: tuple[dict[int, list[Cell]], dict[int, list[Cell]]],
+    ) -> None:
+        self.parent = parent
+        self.direction = direction
+        self.max_size = max_size
+        self.origin = origin
+        self.rc = rc
 
 
-@dataclass
 class GridCells:
-    cells: list[Cell]
-    dimensions: tuple[list[float], list[float]]
+    __slots__ = ('cells', 'dimensions')
+
+    def __init__(self, cells: list[Cell], dimensions: tuple[list[float], list[float]]) -> None:
+        self.cells = cells
+        self.dimensions = dimensions
 
 
-@dataclass
 class SubGridCells:
-    parent: LayoutNode
-    cell: Cell
-    cells: list[Cell]
+    # kept by the subgrid node, so refers to its grid parent weakly
+    __slots__ = ('_parent', 'cell', 'cells')
+
+    def __init__(self, parent: LayoutNode, cell: CellSpan, cells: list[Cell]) -> None:
+        self._parent = weakref.ref(parent)
+        self.cell = cell
+        self.cells = cells
+
+    @property
+    def parent(self) -> LayoutNode:
+        result = self._parent()
+        assert result is not None
+        return result
 
 
 def next_span(current: int, span: Span, max_size: int | None = None) -> tuple[int, int]:
@@ -58,7 +88,7 @@ def next_span(current: int, span: Span, max_size: int | None = None) -> tuple[in
 
 
 def subgrid_cells(node: LayoutNode) -> SubGridCells | None:
-    return getattr(node, '_subgrid_cells', None)
+    return node._subgrid_cells
 
 
 class GridLayout:
@@ -102,10 +132,8 @@ class GridLayout:
 
     @staticmethod
     def cells(node: LayoutNode, subgrid: SubGrid | None = None) -> SubGridCells | GridCells:
-        try:
-            return node._grid_cells  # type: ignore[no-any-return,attr-defined]
-        except AttributeError:
-            pass
+        if node._grid_cells is not None:
+            return node._grid_cells
 
         if subgrid:
             d = subgrid.direction
@@ -122,8 +150,9 @@ class GridLayout:
             rc = ({}, {})
             parent = node
 
-        cells = []
-        subgrids = []
+        cells: list[Cell] = []
+        subgrids: list[CellSpan] = []
+        cell: CellSpan
         imax_size = 0
         next_r = 2
         r = c = 1  # rows and cols are 1-base indexed
@@ -181,9 +210,8 @@ class GridLayout:
                 max(it.end[d] for it in cells + subgrids), grid_origin[d] + (max_size or 0)
             )
             max_alt = max(it.end[o] for it in cells + subgrids)
-            cell = Cell(opos, dtup2(d, max_main, max_alt), node)
-            result = SubGridCells(parent, cell, cells)
-            node._subgrid_cells = result  # type: ignore[attr-defined]
+            result = SubGridCells(parent, CellSpan(opos, dtup2(d, max_main, max_alt)), cells)
+            node._subgrid_cells = result
             return result
 
         cols, rows = rc
@@ -208,7 +236,7 @@ class GridLayout:
             ccol.append(ccol[-1] + w + g[0])
 
         gresult = GridCells(cells, (ccol, crow))
-        node._grid_cells = gresult  # type: ignore[attr-defined]
+        node._grid_cells = gresult
         return gresult
 
     @staticmethod
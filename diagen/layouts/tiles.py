@@ -0,0 +1,48 @@
+from bisect import bisect
+from math import floor
+from typing import Hashable, Iterator
+
+from . import LayoutNode
+from .grid import GridLayout, subgrid_cells
+
+
+def top_cells(node: LayoutNode) -> Iterator[LayoutNode]:
+    for it in node.children:
+        if it.props.virtual:
+            yield from top_cells(it)
+        else:
+            yield it
+
+
+def track_bounds(node: LayoutNode, direction: int) -> list[float]:
+    while len(node.children) == 1:
+        node = node.children[0]
+
+    if node.props.layout is not GridLayout or subgrid_cells(node) or not node.children:
+        return []
+
+    dims = GridLayout.cells(node).dimensions[direction]
+    start = node.position[direction] + node.props.padding[direction]
+    return [start + it for it in dims[1:-1]]
+
+
+def split_tiles(
+    root: LayoutNode, tile_size: tuple[float, float] | None = None, direction: int = 1
+) -> list[list[LayoutNode]]:
+    # Groups top level cells by tiles of a fixed size or by tracks of a top
+    # level grid. Cells are assigned by their center.
+    bounds = track_bounds(root, direction)
+
+    def key(node: LayoutNode) -> Hashable:
+        p = node.position
+        s = node.size
+        cx, cy = p[0] + s[0] / 2, p[1] + s[1] / 2
+        if tile_size:
+            return floor(cy / tile_size[1]), floor(cx / tile_size[0])
+        return bisect(bounds, (cx, cy)[direction])
+
+    groups: dict[Hashable, list[LayoutNode]] = {}
+    for it in top_cells(root):
+        groups.setdefault(key(it), []).append(it)
+
+    return [groups[it] for it in sorted(groups)]  # type: ignore[type-var]
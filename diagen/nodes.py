@@ -1,8 +1,21 @@
+import weakref
 from contextlib import contextmanager
 from contextvars import ContextVar, Token
 from dataclasses import dataclass, replace
-from functools import cached_property
-from typing import Any, Collection, Generic, Iterable, Iterator, Self, Union, Unpack
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Generic,
+    Hashable,
+    Iterable,
+    Iterator,
+    Self,
+    Sequence,
+    TypeVar,
+    Union,
+    Unpack,
+)
 
 from .stylemap import (
     ClassList,
@@ -15,30 +28,118 @@ from .stylemap import (
     NodeStyleMap,
     PropsT,
     StyleMap,
+    split_classes,
 )
+from .utils import LRUCache
 
 _children_stack = ContextVar[list['Node']]('_children_stack')
+_current_diagram = ContextVar['Diagram']('_current_diagram')
 
 AnyNode = Union['Node', str]
 
 
-class Node:
-    children: list['Node']
+T = TypeVar('T')
+
+
+def append(items: Sequence[T], item: T) -> list[T]:
+    # empty sequences are shared tuples, lists are allocated on first append
+    if isinstance(items, list):
+        items.append(item)
+        return items
+    return [*items, item]
+
+
+# weak reference to a diagram with its epoch, shared by all nodes of the diagram
+OwnerKey = tuple[weakref.ref['Diagram'], int]
+
+
+class Diagram:
+    # Owns edges created inside its context and per node layout state. Nodes
+    # refer to owned edges by index through a weak reference, so node <-> edge
+    # links don't form reference cycles and dropping the diagram with its
+    # nodes frees everything by refcount.
+    #
+    # Callers must keep the diagram alive while its nodes are used, e.g.
+    # `with Diagram() as diagram: ...` and render before dropping `diagram`.
+    # Edges of a dropped or reset diagram raise RuntimeError on access.
+    __slots__ = ('edges', 'positions', 'key', '_tokens', '__weakref__')
+
     edges: list['Edge']
-    _cs_token: list[Token[list['Node']]]
+    positions: dict['Node', list[dict['Edge', float]]]
+    key: OwnerKey
+
+    def __init__(self) -> None:
+        self.edges = []
+        self.positions = {}
+        self.key = weakref.ref(self), 0
+        self._tokens: list[Token[Diagram]] = []
+
+    def __enter__(self) -> Self:
+        self._tokens.append(_current_diagram.set(self))
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        _current_diagram.reset(self._tokens.pop())
+
+    def add_edge(self, edge: 'Edge') -> int:
+        self.edges.append(edge)
+        return len(self.edges) - 1
+
+    def reset(self) -> None:
+        # drops owned edges and layout state, the diagram is reused for the
+        # next build, nodes bound to the previous epoch become unusable
+        self.edges.clear()
+        self.positions.clear()
+        self.key = self.key[0], self.key[1] + 1
+
+
+class Node:
+    __slots__ = (
+        'id',
+        'classes',
+        'props',
+        'label',
+        'children',
+        'stylemap',
+        '_edges',
+        '_owner',
+        '_edge_ids',
+        '_added',
+        '_cs_token',
+        '_edge_positions',
+        '__weakref__',
+    )
+
+    label: Sequence[str]
+    children: Sequence['Node']
+    # edges created outside of a diagram
+    _edges: Sequence['Edge']
+    # indexes of edges owned by a diagram
+    _owner: OwnerKey | None
+    _edge_ids: Sequence[int]
+    _cs_token: list[Token[list['Node']]] | None
+    _edge_positions: list[dict['Edge', float]] | None
 
     def __init__(
-        self, props: NodeProps, children: Collection[AnyNode], stylemap: NodeStyleMap
+        self,
+        props: NodeProps,
+        children: Collection[AnyNode],
+        stylemap: NodeStyleMap,
+        classes: tuple[str, ...] = (),
     ) -> None:
         self.id = ''
+        self.classes = classes
         self.props = stylemap.eval_props(props)
-        self.label = list(it for it in children if isinstance(it, str))
-        self.children = list(it for it in children if isinstance(it, Node))
+        self.label = [it for it in children if isinstance(it, str)] or ()
+        self.children = [it for it in children if isinstance(it, Node)] or ()
         self.stylemap = stylemap
-        self.edges = []
+        self._edges = ()
+        self._owner = None
+        self._edge_ids = ()
 
         self._added = False
-        self._cs_token = []
+        self._cs_token = None
+        self._edge_positions = None
 
         for it in self.children:
             it._added = True
@@ -55,16 +156,17 @@ class Node:
         return a0, a1
 
     def __enter__(self) -> Self:
-        self._cs_token.append(_children_stack.set([]))
+        self._cs_token = append(self._cs_token or (), _children_stack.set([]))
         return self
 
     def __exit__(self, *args: Any) -> None:
         children = _children_stack.get()
+        assert self._cs_token
         _children_stack.reset(self._cs_token.pop())
         for it in children:
             if isinstance(it, Node) and not it._added:
                 it._added = True
-                self.children.append(it)
+                self.children = append(self.children, it)
 
     def get_label(self) -> str:
         return self.props.label_formatter(self.props, self.label)
@@ -92,8 +194,59 @@ class Node:
     def node_ref(self) -> 'Node':
         return self
 
-    @cached_property
+    def _diagram(self) -> Diagram | None:
+        if self._owner is None:
+            return None
+        diagram = self._owner[0]()
+        if diagram is None or diagram.key is not self._owner:
+            if self._edge_ids:
+                raise RuntimeError(
+                    'Node edges are owned by a Diagram which was dropped or reset,'
+                    ' keep the Diagram alive while its nodes are used'
+                )
+            return None
+        return diagram
+
+    @property
+    def edges(self) -> Sequence['Edge']:
+        if not self._edge_ids:
+            return self._edges
+
+        diagram = self._diagram()
+        assert diagram is not None
+        arena = diagram.edges
+        owned = [arena[it] for it in self._edge_ids]
+        return [*self._edges, *owned] if self._edges else owned
+
+    def add_edge(self, edge: 'Edge', diagram: Diagram | None = None, index: int = 0) -> None:
+        # index of the edge in diagram edges
+        if diagram is not None:
+            key = diagram.key
+            if self._owner is not key and self._diagram() is None:
+                # first owned edge
+                self._owner = key
+                self._edge_ids = ()
+            if self._owner is key:
+                self._edge_ids = append(self._edge_ids, index)
+                return
+        # no diagram or the node is bound to another one
+        self._edges = append(self._edges, edge)
+
+    @property
     def edge_positions(self) -> list[dict['Edge', float]]:
+        if (diagram := self._diagram()) is not None:
+            try:
+                return diagram.positions[self]
+            except KeyError:
+                pass
+            result = diagram.positions[self] = self._make_edge_positions()
+            return result
+
+        if self._edge_positions is None:
+            self._edge_positions = self._make_edge_positions()
+        return self._edge_positions
+
+    def _make_edge_positions(self) -> list[dict['Edge', float]]:
         result: list[dict['Edge', float]] = [{}, {}, {}, {}]
 
         count = [0, 0, 0, 0]
@@ -125,7 +278,7 @@ class Node:
         return result
 
 
-@dataclass
+@dataclass(slots=True)
 class Port:
     node: Node
     side: int
@@ -153,7 +306,26 @@ class Port:
 AnyEdgePort = Node | Port
 
 
+def port_classes(port: AnyEdgePort) -> tuple[str, ...]:
+    if isinstance(port, Port) and port.classes:
+        return tuple(port.classes)
+    return ()
+
+
 class Edge:
+    __slots__ = (
+        'id',
+        'classes',
+        'props',
+        'source',
+        'target',
+        'label',
+        'stylemap',
+        '__weakref__',
+    )
+
+    label: Sequence[str]
+
     def __init__(
         self,
         props: EdgeProps,
@@ -161,28 +333,30 @@ class Edge:
         target: AnyEdgePort,
         label: Collection[str],
         stylemap: EdgeStyleMap,
+        classes: tuple[str, ...] = (),
     ) -> None:
         self.id = ''
+        self.classes = classes
         self.props = props
         self.source = source
         self.target = target
-        self.label = list(label)
+        self.label = list(label) or ()
         self.stylemap = stylemap
 
-        source.node_ref.edges.append(self)
-        self._apply_port_styles(source, 'start-')
-
-        target.node_ref.edges.append(self)
-        self._apply_port_styles(target, 'end-')
-
-        self.props = stylemap.eval_props(self.props)
-
-    def _apply_port_styles(self, port: AnyEdgePort, prefix: str) -> None:
-        if isinstance(port, Port):
-            if port.classes:
-                self.props = self.stylemap.resolve_classes(
-                    [prefix + it for it in port.classes], self.props
-                )
+        diagram = _current_diagram.get(None)
+        # raises on stale ends before the edge lands in the diagram
+        source.node_ref._diagram()
+        target.node_ref._diagram()
+        index = diagram.add_edge(self) if diagram is not None else 0
+        source.node_ref.add_edge(self, diagram, index)
+        target.node_ref.add_edge(self, diagram, index)
+
+        start = port_classes(source)
+        end = port_classes(target)
+        if start or end:
+            self.props = stylemap.resolve_ports(props, start, end)
+        else:
+            self.props = stylemap.eval_props(props)
 
     def get_label(self) -> str:
         return self.props.label_formatter(self.props, self.label)
@@ -193,34 +367,127 @@ class Edge:
                 yield it
 
 
+def props_classes(props: NodeKeys | EdgeKeys) -> tuple[str, ...]:
+    if classes := props.get('classes'):
+        return tuple(split_classes(classes))
+    return ()
+
+
 class BaseFactory(Generic[PropsT, KeysT]):
     stylemap: StyleMap[PropsT, KeysT]
-    factory_props: PropsT
+    _parent: Self | None
+    _derive: Callable[[PropsT], PropsT] | None
+    _base_props: PropsT | None
+    _props: PropsT | None
 
-    def __init__(self, stylemap: StyleMap[PropsT, KeysT], props: PropsT | None = None):
-        self.factory_props = props if props is not None else stylemap.default_props()
+    def __init__(
+        self,
+        stylemap: StyleMap[PropsT, KeysT],
+        props: PropsT | None = None,
+        *,
+        parent: Self | None = None,
+        derive: Callable[[PropsT], PropsT] | None = None,
+        classes: tuple[str, ...] = (),
+    ):
         self.stylemap = stylemap
+        # classes applied by the factory chain, recorded on created items
+        self.classes = classes
+        # factory props are derived from parent props and re-resolved lazily
+        # when stylemap generation changes
+        self._parent = parent
+        self._derive = derive
+        self._base_props = props
+        self._props = None
+        self._generation = -1
+        self._children: LRUCache[Hashable, Self] = LRUCache(256)
+
+    @property
+    def factory_props(self) -> PropsT:
+        if self._generation != self.stylemap.generation or self._props is None:
+            self._generation = self.stylemap.generation
+            self._props = self._resolve()
+        return self._props
+
+    def _resolve(self) -> PropsT:
+        props: PropsT
+        if self._parent is not None:
+            props = self._parent.factory_props
+        elif self._base_props is not None:
+            props = self._base_props
+        else:
+            props = self.stylemap.default_props()
+        if self._derive is not None:
+            props = self._derive(props)
+        return props
+
+    def _child(
+        self, key: Hashable, derive: Callable[[PropsT], PropsT], classes: tuple[str, ...]
+    ) -> Self:
+        try:
+            return self._children[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable props
+            return self._make_child(derive, classes)
+
+        child = self._children[key] = self._make_child(derive, classes)
+        return child
+
+    def _make_child(self, derive: Callable[[PropsT], PropsT], classes: tuple[str, ...]) -> Self:
+        child = type(self)(
+            self.stylemap, parent=self, derive=derive, classes=self.classes + classes
+        )
+        # resolved eagerly, so unknown classes fail at the definition site,
+        # only later generation changes are re-resolved lazily. With deferred
+        # loading pending the classes may come from a loader, so resolving
+        # waits for the first use instead of forcing the load
+        if not self.stylemap.has_deferred:
+            child._props = child._resolve()
+            child._generation = self.stylemap.generation
+        return child
 
     def __getitem__(self, classes: ClassList) -> Self:
-        nprops = self.stylemap.resolve_classes(classes, self.factory_props)
-        return type(self)(self.stylemap, nprops)
+        key = 0, classes if type(classes) is str else tuple(classes)
+        return self._child(
+            key,
+            lambda base: self.stylemap.resolve_classes(classes, base),
+            tuple(split_classes(classes)),
+        )
 
     def _make_props(self, props: KeysT | None) -> PropsT:
         if props is not None:
             return self.stylemap.resolve_props((props,), self.factory_props)
         return self.factory_props
 
+    def _make_classes(self, props: KeysT | None) -> tuple[str, ...]:
+        if props is not None:
+            return self.classes + props_classes(props)
+        return self.classes
+
     def _add_props(self, props: KeysT) -> Self:
-        return type(self)(self.stylemap, self._make_props(props))
+        return self._child(
+            (1, tuple(props.items())),
+            lambda base: self.stylemap.resolve_props((props,), base),
+            props_classes(props),
+        )
 
 
 class NodeFactory(BaseFactory[NodeProps, NodeKeys]):
-    def __init__(self, stylemap: NodeStyleMap, props: NodeProps | None = None):
-        super().__init__(stylemap, props)
+    def __init__(
+        self,
+        stylemap: NodeStyleMap,
+        props: NodeProps | None = None,
+        *,
+        parent: Self | None = None,
+        derive: Callable[[NodeProps], NodeProps] | None = None,
+        classes: tuple[str, ...] = (),
+    ):
+        super().__init__(stylemap, props, parent=parent, derive=derive, classes=classes)
         self._cm_stack: list[Node] = []
 
     def __call__(self, *rest: AnyNode, props: NodeKeys | None = None) -> Node:
-        return Node(self._make_props(props), rest, self.stylemap)
+        return Node(self._make_props(props), rest, self.stylemap, self._make_classes(props))
 
     def __enter__(self) -> Node:
         node = self()
@@ -239,7 +506,14 @@ class EdgeFactory(BaseFactory[EdgeProps, EdgeKeys]):
     def __call__(
         self, source: AnyEdgePort, target: AnyEdgePort, /, *rest: str, props: EdgeKeys | None = None
     ) -> Edge:
-        return Edge(self._make_props(props), source, target, rest, self.stylemap)
+        return Edge(
+            self._make_props(props),
+            source,
+            target,
+            rest,
+            self.stylemap,
+            self._make_classes(props),
+        )
 
     def props(self, **kwargs: Unpack[EdgeKeys]) -> Self:
         return self._add_props(kwargs)
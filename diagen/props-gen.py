@@ -15,29 +15,81 @@ NODE_PROPS = """\
 
     # drawio
     link: str | None
-    label_formatter: Callable[['NodeProps', list[str]], str]
+    label_formatter: Callable[['NodeProps', Sequence[str]], str]
 """.rstrip()
 
 
 EDGE_PROPS = """\
     scale: float
     arc_size: float | None
-    label_formatter: Callable[['EdgeProps', list[str]], str]
+    label_formatter: Callable[['EdgeProps', Sequence[str]], str]
     label_offset: tuple[float, float]
     spacing: tuple[float | None, float | None]
     spacing_both: float | None
     jump_size: float | None
 """.rstrip()
 
+# field expressions of eval_node_props, others are copied as is
+NODE_EVAL = {
+    'size': '(w * m if w is not None else None, h * m if h is not None else None)',
+    'gap': '(g[0] * m, g[1] * m)',
+    'padding': '(p[0] * m, p[1] * m, p[2] * m, p[3] * m)',
+}
+
+
+def field_names(fields: str) -> list[str]:
+    lines = (it.strip() for it in fields.splitlines())
+    return [it.partition(':')[0] for it in lines if it and not it.startswith('#')]
+
+
+def make_setters(kind: str, cls: str, fields: str) -> str:
+    names = field_names(fields) + ['drawio_style']
+    return ''.join(f"_set_{kind}_{it} = vars({cls})['{it}'].__set__\n" for it in names)
+
+
+def make_body(kind: str, cls: str, fields: str, values: dict[str, str], default: str) -> str:
+    names = field_names(fields) + ['drawio_style']
+    lines = [f'    result: {cls} = _new({cls})']
+    for it in names:
+        lines.append(f'    _set_{kind}_{it}(result, {values.get(it, default.format(it))})')
+    lines.append('    return result')
+    return '\n'.join(lines) + '\n'
+
+
+def make_merge(kind: str, cls: str, fields: str) -> str:
+    keys = cls.replace('Props', 'Keys')
+    body = make_body(
+        kind, cls, fields, {'drawio_style': 'drawio_style'}, "data.get('{0}', props.{0})"
+    )
+    return f"""\
+def merge_{kind}_props(props: {cls}, data: {keys}, drawio_style: 'Style') -> {cls}:
+{body}"""
+
+
+def make_eval_node() -> str:
+    body = make_body('node', 'NodeProps', NODE_PROPS, NODE_EVAL, 'props.{0}')
+    return f"""\
+def eval_node_props(props: NodeProps) -> NodeProps:
+    m = props.scale
+    w, h = props.size
+    g = props.gap
+    p = props.padding
+{body}"""
+
+
 BODY = f"""\
 from dataclasses import dataclass, field
-from typing import TYPE_CHECKING, Callable, Protocol, TypedDict
+from typing import TYPE_CHECKING, Callable, Mapping, Protocol, Sequence, TypedDict
 
 if TYPE_CHECKING:
     from .layouts import LayoutNode
+    from .stylemap import Style
 
 
-BackendStyle = dict[str, int | float | str | list[str]]
+StyleValue = int | float | str | list[str]
+StyleDict = dict[str, StyleValue]
+# style as accepted from style definitions, props keep interned Style
+BackendStyle = Mapping[str, StyleValue]
 ClassList = str | list[str]
 
 
@@ -55,11 +107,11 @@ class Span:
     rel_end: bool = field(default=True, kw_only=True)
 
 
-@dataclass(frozen=True, kw_only=True)
+@dataclass(frozen=True, kw_only=True, slots=True)
 class NodeProps:
 {NODE_PROPS}
 
-    drawio_style: BackendStyle
+    drawio_style: 'Style'
 
 
 class NodeKeys(TypedDict, total=False):
@@ -69,11 +121,11 @@ class NodeKeys(TypedDict, total=False):
     drawio_style: BackendStyle | str
 
 
-@dataclass(frozen=True, kw_only=True)
+@dataclass(frozen=True, kw_only=True, slots=True)
 class EdgeProps:
 {EDGE_PROPS}
 
-    drawio_style: BackendStyle
+    drawio_style: 'Style'
 
 
 class EdgeKeys(TypedDict, total=False):
@@ -81,7 +133,21 @@ class EdgeKeys(TypedDict, total=False):
 
     classes: ClassList
     drawio_style: BackendStyle | str
-"""
+
+
+# Specialized per field versions of generic dataclasses.replace based code.
+# Instances are built with slot setters, bypassing frozen __setattr__.
+
+_new = object.__new__
+
+{make_setters('node', 'NodeProps', NODE_PROPS)}
+{make_setters('edge', 'EdgeProps', EDGE_PROPS)}
+
+{make_merge('node', 'NodeProps', NODE_PROPS)}
+
+{make_merge('edge', 'EdgeProps', EDGE_PROPS)}
+
+{make_eval_node()}"""
 
 if __name__ == '__main__':
     import os.path
@@ -1,11 +1,15 @@
 from dataclasses import dataclass, field
-from typing import TYPE_CHECKING, Callable, Protocol, TypedDict
+from typing import TYPE_CHECKING, Callable, Mapping, Protocol, Sequence, TypedDict
 
 if TYPE_CHECKING:
     from .layouts import LayoutNode
+    from .stylemap import Style
 
 
-BackendStyle = dict[str, int | float | str | list[str]]
+StyleValue = int | float | str | list[str]
+StyleDict = dict[str, StyleValue]
+# style as accepted from style definitions, props keep interned Style
+BackendStyle = Mapping[str, StyleValue]
 ClassList = str | list[str]
 
 
@@ -23,7 +27,7 @@ class Span:
     rel_end: bool = field(default=True, kw_only=True)
 
 
-@dataclass(frozen=True, kw_only=True)
+@dataclass(frozen=True, kw_only=True, slots=True)
 class NodeProps:
     direction: int
     layout: 'Layout'
@@ -41,9 +45,9 @@ class NodeProps:
 
     # drawio
     link: str | None
-    label_formatter: Callable[['NodeProps', list[str]], str]
+    label_formatter: Callable[['NodeProps', Sequence[str]], str]
 
-    drawio_style: BackendStyle
+    drawio_style: 'Style'
 
 
 class NodeKeys(TypedDict, total=False):
@@ -63,29 +67,29 @@ class NodeKeys(TypedDict, total=False):
 
     # drawio
     link: str | None
-    label_formatter: Callable[['NodeProps', list[str]], str]
+    label_formatter: Callable[['NodeProps', Sequence[str]], str]
 
     classes: ClassList
     drawio_style: BackendStyle | str
 
 
-@dataclass(frozen=True, kw_only=True)
+@dataclass(frozen=True, kw_only=True, slots=True)
 class EdgeProps:
     scale: float
     arc_size: float | None
-    label_formatter: Callable[['EdgeProps', list[str]], str]
+    label_formatter: Callable[['EdgeProps', Sequence[str]], str]
     label_offset: tuple[float, float]
     spacing: tuple[float | None, float | None]
     spacing_both: float | None
     jump_size: float | None
 
-    drawio_style: BackendStyle
+    drawio_style: 'Style'
 
 
 class EdgeKeys(TypedDict, total=False):
     scale: float
     arc_size: float | None
-    label_formatter: Callable[['EdgeProps', list[str]], str]
+    label_formatter: Callable[['EdgeProps', Sequence[str]], str]
     label_offset: tuple[float, float]
     spacing: tuple[float | None, float | None]
     spacing_both: float | None
@@ -93,3 +97,91 @@ class EdgeKeys(TypedDict, total=False):
 
     classes: ClassList
     drawio_style: BackendStyle | str
+
+
+# Specialized per field versions of generic dataclasses.replace based code.
+# Instances are built with slot setters, bypassing frozen __setattr__.
+
+_new = object.__new__
+
+_set_node_direction = vars(NodeProps)['direction'].__set__
+_set_node_layout = vars(NodeProps)['layout'].__set__
+_set_node_scale = vars(NodeProps)['scale'].__set__
+_set_node_size = vars(NodeProps)['size'].__set__
+_set_node_padding = vars(NodeProps)['padding'].__set__
+_set_node_gap = vars(NodeProps)['gap'].__set__
+_set_node_virtual = vars(NodeProps)['virtual'].__set__
+_set_node_align = vars(NodeProps)['align'].__set__
+_set_node_items_align = vars(NodeProps)['items_align'].__set__
+_set_node_subgrid = vars(NodeProps)['subgrid'].__set__
+_set_node_grid_size = vars(NodeProps)['grid_size'].__set__
+_set_node_grid_cell = vars(NodeProps)['grid_cell'].__set__
+_set_node_link = vars(NodeProps)['link'].__set__
+_set_node_label_formatter = vars(NodeProps)['label_formatter'].__set__
+_set_node_drawio_style = vars(NodeProps)['drawio_style'].__set__
+
+_set_edge_scale = vars(EdgeProps)['scale'].__set__
+_set_edge_arc_size = vars(EdgeProps)['arc_size'].__set__
+_set_edge_label_formatter = vars(EdgeProps)['label_formatter'].__set__
+_set_edge_label_offset = vars(EdgeProps)['label_offset'].__set__
+_set_edge_spacing = vars(EdgeProps)['spacing'].__set__
+_set_edge_spacing_both = vars(EdgeProps)['spacing_both'].__set__
+_set_edge_jump_size = vars(EdgeProps)['jump_size'].__set__
+_set_edge_drawio_style = vars(EdgeProps)['drawio_style'].__set__
+
+
+def merge_node_props(props: NodeProps, data: NodeKeys, drawio_style: 'Style') -> NodeProps:
+    result: NodeProps = _new(NodeProps)
+    _set_node_direction(result, data.get('direction', props.direction))
+    _set_node_layout(result, data.get('layout', props.layout))
+    _set_node_scale(result, data.get('scale', props.scale))
+    _set_node_size(result, data.get('size', props.size))
+    _set_node_padding(result, data.get('padding', props.padding))
+    _set_node_gap(result, data.get('gap', props.gap))
+    _set_node_virtual(result, data.get('virtual', props.virtual))
+    _set_node_align(result, data.get('align', props.align))
+    _set_node_items_align(result, data.get('items_align', props.items_align))
+    _set_node_subgrid(result, data.get('subgrid', props.subgrid))
+    _set_node_grid_size(result, data.get('grid_size', props.grid_size))
+    _set_node_grid_cell(result, data.get('grid_cell', props.grid_cell))
+    _set_node_link(result, data.get('link', props.link))
+    _set_node_label_formatter(result, data.get('label_formatter', props.label_formatter))
+    _set_node_drawio_style(result, drawio_style)
+    return result
+
+
+def merge_edge_props(props: EdgeProps, data: EdgeKeys, drawio_style: 'Style') -> EdgeProps:
+    result: EdgeProps = _new(EdgeProps)
+    _set_edge_scale(result, data.get('scale', props.scale))
+    _set_edge_arc_size(result, data.get('arc_size', props.arc_size))
+    _set_edge_label_formatter(result, data.get('label_formatter', props.label_formatter))
+    _set_edge_label_offset(result, data.get('label_offset', props.label_offset))
+    _set_edge_spacing(result, data.get('spacing', props.spacing))
+    _set_edge_spacing_both(result, data.get('spacing_both', props.spacing_both))
+    _set_edge_jump_size(result, data.get('jump_size', props.jump_size))
+    _set_edge_drawio_style(result, drawio_style)
+    return result
+
+
+def eval_node_props(props: NodeProps) -> NodeProps:
+    m = props.scale
+    w, h = props.size
+    g = props.gap
+    p = props.padding
+    result: NodeProps = _new(NodeProps)
+    _set_node_direction(result, props.direction)
+    _set_node_layout(result, props.layout)
+    _set_node_scale(result, props.scale)
+    _set_node_size(result, (w * m if w is not None else None, h * m if h is not None else None))
+    _set_node_padding(result, (p[0] * m, p[1] * m, p[2] * m, p[3] * m))
+    _set_node_gap(result, (g[0] * m, g[1] * m))
+    _set_node_virtual(result, props.virtual)
+    _set_node_align(result, props.align)
+    _set_node_items_align(result, props.items_align)
+    _set_node_subgrid(result, props.subgrid)
+    _set_node_grid_size(result, props.grid_size)
+    _set_node_grid_cell(result, props.grid_cell)
+    _set_node_link(result, props.link)
+    _set_node_label_formatter(result, props.label_formatter)
+    _set_node_drawio_style(result, props.drawio_style)
+    return result
@@ -0,0 +1,179 @@
+import re
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from typing import Iterable, Iterator
+
+from .nodes import Edge, Node
+from .stylemap import (
+    BackendStyle,
+    EdgeProps,
+    NodeProps,
+    get_style,
+    intern_style,
+    merge_drawio_style,
+)
+
+__all__ = ['ClassIndex', 'Selector', 'parse_selector', 'restyle']
+
+Item = Node | Edge
+Props = NodeProps | EdgeProps
+# ' ' descendant or '>' child
+Combinator = str
+
+
+@dataclass(frozen=True)
+class Step:
+    kind: str | None  # 'node', 'edge' or any
+    classes: tuple[str, ...]
+
+    def match(self, item: Item) -> bool:
+        if self.kind is not None and self.kind != ('node' if isinstance(item, Node) else 'edge'):
+            return False
+        return all(it in item.classes for it in self.classes)
+
+
+# steps with combinators to the previous step, first combinator is unused
+Selector = tuple[tuple[Combinator, Step], ...]
+
+# dot followed by a digit is a part of a class value: `size-1.5`
+_class_sep = re.compile(r'\.(?!\d)')
+_combinators = re.compile(r'\s*(>)\s*|\s+')
+
+
+def parse_step(token: str) -> Step:
+    kind, *classes = _class_sep.split(token)
+    if kind in ('', '*'):
+        kind_value = None
+    elif kind in ('node', 'edge'):
+        kind_value = kind
+    else:
+        raise ValueError(f'Invalid selector step: {token}')
+
+    if any(not it for it in classes):
+        raise ValueError(f'Invalid selector step: {token}')
+
+    return Step(kind_value, tuple(classes))
+
+
+# CSS-like subset: `node` and `edge` type selectors, `*`, `.class` compounds,
+# descendant (space) and child (`>`) combinators, e.g. `.c4-boundary > node.c4-storage`
+@lru_cache(256)
+def parse_selector(selector: str) -> Selector:
+    parts = _combinators.split(selector.strip())
+    tokens = parts[::2]
+    combinators = [' '] + [it or ' ' for it in parts[1::2]]
+    if not all(tokens):
+        raise ValueError(f'Invalid selector: {selector!r}')
+    return tuple((c, parse_step(t)) for c, t in zip(combinators, tokens))
+
+
+class ClassIndex:
+    # Class -> nodes and edges of a diagram, built with a single tree walk.
+    # Queries start from the smallest class set of the last selector step and
+    # check ancestors, so cost depends on matches, not tree size. Edges are
+    # placed under the nearest common ancestor of their ends.
+
+    def __init__(self, root: Node) -> None:
+        self.root = root
+        self.parents: dict[Item, Node | None] = {root: None}
+        self.up: dict[Node, Node] = {}
+        self.depth: dict[Node, int] = {root: 0}
+        # dicts as ordered sets, nodes in tree order followed by edges
+        self.items: dict[Item, None] = {}
+        self.classes: dict[str, dict[Item, None]] = {}
+        self.edges: dict[Edge, None] = {}
+
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            self.items[node] = None
+            self._add(node)
+            self.edges.update(dict.fromkeys(node.edges))
+            for it in node.children:
+                self.parents[it] = self.up[it] = node
+                self.depth[it] = self.depth[node] + 1
+            stack.extend(reversed(node.children))
+
+        for edge in self.edges:
+            self.parents[edge] = self.common_parent(edge.source.node_ref, edge.target.node_ref)
+            self.items[edge] = None
+            self._add(edge)
+
+    def _add(self, item: Item) -> None:
+        for it in item.classes:
+            self.classes.setdefault(it, {})[item] = None
+
+    def common_parent(self, a: Node, b: Node) -> Node | None:
+        if a not in self.depth or b not in self.depth:
+            return None
+
+        up = self.up
+        da, db = self.depth[a], self.depth[b]
+        for _ in range(da - db):
+            a = up[a]
+        for _ in range(db - da):
+            b = up[b]
+        while a is not b:
+            a, b = up[a], up[b]
+        return a
+
+    def ancestors(self, item: Item) -> Iterator[Node]:
+        parent = self.parents.get(item)
+        while parent is not None:
+            yield parent
+            parent = self.parents[parent]
+
+    def candidates(self, step: Step) -> Iterable[Item]:
+        if not step.classes:
+            return self.edges if step.kind == 'edge' else self.items
+
+        sets = sorted((self.classes.get(it, {}) for it in step.classes), key=len)
+        return (it for it in sets[0] if all(it in s for s in sets[1:]))
+
+    def _match_up(self, item: Item, selector: Selector, idx: int) -> bool:
+        # item matches selector[idx], check previous steps against ancestors
+        if idx == 0:
+            return True
+
+        combinator = selector[idx][0]
+        step = selector[idx - 1][1]
+        for it in self.ancestors(item):
+            if step.match(it) and self._match_up(it, selector, idx - 1):
+                return True
+            if combinator == '>':
+                break
+        return False
+
+    def select(self, selector: str) -> list[Item]:
+        steps = parse_selector(selector)
+        last = len(steps) - 1
+        step = steps[last][1]
+        return [
+            it for it in self.candidates(step) if step.match(it) and self._match_up(it, steps, last)
+        ]
+
+    def nodes(self, selector: str) -> list[Node]:
+        return [it for it in self.select(selector) if isinstance(it, Node)]
+
+
+def restyle(items: Iterable[Item], drawio_style: BackendStyle | str) -> None:
+    # merges drawio style into evaluated props, items with the same props
+    # keep sharing them
+    style = get_style(drawio_style)
+    memo: dict[int, tuple[Props, Props]] = {}
+
+    def restyled(props: Props) -> Props:
+        try:
+            source, result = memo[id(props)]
+            if source is props:
+                return result
+        except KeyError:
+            pass
+
+        new_style = intern_style(merge_drawio_style(props.drawio_style, style))
+        result = replace(props, drawio_style=new_style)
+        memo[id(props)] = props, result
+        return result
+
+    for it in items:
+        it.props = restyled(it.props)
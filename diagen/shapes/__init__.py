@@ -0,0 +1,31 @@
+import os.path
+
+from .library import ShapeLibrary
+
+__all__ = ['ShapeLibrary', 'library']
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+_libraries: dict[str, ShapeLibrary] = {}
+
+
+def library(namespace: str, path: str | None = None) -> ShapeLibrary:
+    try:
+        return _libraries[namespace]
+    except KeyError:
+        pass
+
+    if path is None:
+        path = os.path.join(DATA_DIR, f'{namespace}.json')
+        if not os.path.exists(path):
+            raise LookupError(f'Unknown shape library: {namespace}')
+
+    result = _libraries[namespace] = ShapeLibrary(namespace, path)
+    return result
+
+
+def __getattr__(name: str) -> ShapeLibrary:
+    # bundled packs as module attributes: `from diagen.shapes import network`
+    if not name.startswith('_') and os.path.exists(os.path.join(DATA_DIR, f'{name}.json')):
+        return library(name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -1,8 +1,10 @@
+from typing import Sequence
+
 from .. import base_edge, base_node, styles
 from ..stylemap import EdgeProps, NodeProps
 
 
-def c4_label_fmt(props: NodeProps | EdgeProps, label: list[str]) -> str:
+def c4_label_fmt(props: NodeProps | EdgeProps, label: Sequence[str]) -> str:
     if not label:
         return ''
 
@@ -0,0 +1,113 @@
+import json
+from typing import TypedDict, cast
+
+from .. import base_edge, base_node, styles
+from ..nodes import EdgeFactory, NodeFactory
+from ..stylemap import EdgeKeys, KeysT, NodeKeys
+from ..utils import kebab_case
+
+# keys allowed in pack entries, everything else needs code (formatters, layouts)
+ENTRY_KEYS = {'classes', 'drawio_style'}
+
+# drawio style string or a dict with `classes` and `drawio_style`
+PackEntry = str | dict[str, str]
+
+
+class PackData(TypedDict, total=False):
+    base: PackEntry
+    nodes: dict[str, PackEntry]
+    edges: dict[str, PackEntry]
+
+
+def pack_entry(value: PackEntry, base: str, result: KeysT) -> KeysT:
+    # fills empty node or edge keys passed in `result`
+    if isinstance(value, str):
+        value = {'drawio_style': value}
+    elif unknown := set(value) - ENTRY_KEYS:
+        raise ValueError(f'Unsupported shape keys: {", ".join(sorted(unknown))}')
+
+    if 'drawio_style' in value:
+        result['drawio_style'] = value['drawio_style']
+    result['classes'] = ' '.join(filter(None, (base, value.get('classes'))))
+    return result
+
+
+class ShapeLibrary:
+    # Shape pack loaded from a json file on first attribute access:
+    #
+    #     {
+    #         "base": {"classes": "size-16/16", "drawio_style": "..."},
+    #         "nodes": {"Router": "shape=mxgraph.cisco.routers.router", ...},
+    #         "edges": {"Link": {"classes": "...", "drawio_style": "..."}, ...}
+    #     }
+    #
+    # Entries are drawio style strings or dicts with `classes` and
+    # `drawio_style`. `Router` is registered as `<namespace>-router` class and
+    # accessible as `lib.Router` node factory, edges via `lib.edge('Link')`.
+
+    def __init__(self, namespace: str, path: str) -> None:
+        self.namespace = namespace
+        self.path = path
+        self._nodes: dict[str, str] | None = None
+        self._edges: dict[str, str] = {}
+
+    def _load(self) -> dict[str, str]:
+        if self._nodes is not None:
+            return self._nodes
+
+        with open(self.path, 'rb') as f:
+            data = cast(PackData, json.load(f))
+
+        ns = self.namespace
+        base = f'{ns}-base'
+        node_styles: dict[str, NodeKeys] = {base: pack_entry(data.get('base', {}), '', NodeKeys())}
+        edge_styles: dict[str, EdgeKeys] = {}
+        nodes: dict[str, str] = {}
+
+        for name, value in data.get('nodes', {}).items():
+            cls = nodes[name] = f'{ns}-{kebab_case(name)}'
+            node_styles[cls] = pack_entry(value, base, NodeKeys())
+
+        for name, value in data.get('edges', {}).items():
+            cls = self._edges[name] = f'{ns}-edge-{kebab_case(name)}'
+            edge_styles[cls] = pack_entry(value, '', EdgeKeys())
+
+        styles.node.update(node_styles)
+        if edge_styles:
+            styles.edge.update(edge_styles)
+
+        self._nodes = nodes
+        return nodes
+
+    def names(self) -> list[str]:
+        return list(self._load())
+
+    def __getattr__(self, name: str) -> NodeFactory:
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        try:
+            cls = self._load()[name]
+        except KeyError:
+            raise AttributeError(
+                f'Shape library {self.namespace!r} has no shape {name!r}'
+            ) from None
+
+        # cached in instance dict, next access skips __getattr__
+        result = base_node[cls]
+        setattr(self, name, result)
+        return result
+
+    def edge(self, name: str) -> EdgeFactory:
+        self._load()
+        try:
+            cls = self._edges[name]
+        except KeyError:
+            raise AttributeError(f'Shape library {self.namespace!r} has no edge {name!r}') from None
+        return base_edge[cls]
+
+    def __dir__(self) -> list[str]:
+        return sorted(set(super().__dir__()) | set(self._load()))
+
+    def __repr__(self) -> str:
+        return f'ShapeLibrary({self.namespace!r}, {self.path!r})'
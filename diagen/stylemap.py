@@ -1,8 +1,32 @@
-import re
+import weakref
 from dataclasses import dataclass, replace
-from typing import Callable, Generic, Iterable, Mapping, TypeVar
-
-from .props import BackendStyle, ClassList, EdgeKeys, EdgeProps, NodeKeys, NodeProps, Span
+from functools import partial
+from typing import (
+    Any,
+    Callable,
+    Generic,
+    Hashable,
+    ItemsView,
+    Iterable,
+    Iterator,
+    KeysView,
+    Mapping,
+    NamedTuple,
+    TypeVar,
+)
+
+from .props import (
+    BackendStyle,
+    ClassList,
+    EdgeKeys,
+    EdgeProps,
+    NodeKeys,
+    NodeProps,
+    Span,
+    StyleDict,
+    StyleValue,
+)
+from .utils import CacheStats, LRUCache
 
 __all__ = [
     'NodeProps',
@@ -10,28 +34,50 @@ __all__ = [
     'NodeKeys',
     'EdgeKeys',
     'BackendStyle',
+    'StyleDict',
+    'StyleValue',
     'ClassList',
     'KeysT',
     'PropsT',
     'Span',
+    'Style',
+    'CacheStats',
+    'intern_style',
+    'style_key',
+    'style_cache_stats',
+    'InternStats',
+    'intern_stats',
+    'set_style_cache_size',
 ]
 
 
 KeysT = TypeVar('KeysT', NodeKeys, EdgeKeys)
 PropsT = TypeVar('PropsT', NodeProps, EdgeProps)
 
-_smap_cache: dict[str, BackendStyle] = {}
+STYLE_CACHE_SIZE = 4096
+RULE_CACHE_SIZE = 4096
+CLASSES_CACHE_SIZE = 4096
+EVAL_CACHE_SIZE = 4096
+PORTS_CACHE_SIZE = 1024
+
+_smap_cache = LRUCache[str, BackendStyle](STYLE_CACHE_SIZE)
+
+
+def style_cache_stats() -> CacheStats:
+    return _smap_cache.stats
+
+
+def set_style_cache_size(maxsize: int) -> None:
+    _smap_cache.resize(maxsize)
 
 
 def get_style(style: str | BackendStyle | None) -> BackendStyle:
     if style is None:
         return {}
 
-    if isinstance(style, dict):
+    if not isinstance(style, str):
         return style
 
-    style = style or ''
-
     try:
         return _smap_cache[style]
     except KeyError:
@@ -44,6 +90,98 @@ def get_style(style: str | BackendStyle | None) -> BackendStyle:
     return result
 
 
+StyleKey = tuple[tuple[str, Hashable], ...]
+
+
+def make_style_key(style: BackendStyle) -> StyleKey:
+    return tuple((k, tuple(v) if isinstance(v, list) else v) for k, v in style.items())
+
+
+class Style(Mapping[str, StyleValue]):
+    # Immutable resolved style with precomputed hash, interned and shared by
+    # all props with the same content. `strings` memoizes serialized forms.
+    __slots__ = ('_data', 'key', 'hash', 'strings', '__weakref__')
+
+    def __init__(self, data: BackendStyle | None = None, key: StyleKey | None = None) -> None:
+        self._data = dict(data) if data is not None else {}
+        self.key = make_style_key(self._data) if key is None else key
+        self.hash = hash(self.key)
+        self.strings: dict[Hashable, str] = {}
+
+    def __getitem__(self, key: str) -> StyleValue:
+        return self._data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._data
+
+    def keys(self) -> KeysView[str]:
+        return self._data.keys()
+
+    def items(self) -> ItemsView[str, StyleValue]:
+        return self._data.items()
+
+    def __hash__(self) -> int:
+        return self.hash
+
+    def __eq__(self, other: object) -> bool:
+        if type(other) is Style:
+            return self is other or (self.hash == other.hash and self.key == other.key)
+        if isinstance(other, Mapping):
+            return self._data == dict(other)
+        return NotImplemented
+
+    def __or__(self, other: BackendStyle) -> StyleDict:
+        return self._data | dict(other)
+
+    def __repr__(self) -> str:
+        return f'Style({self._data!r})'
+
+
+# styles live while some props refer to them
+_interned_styles: 'weakref.WeakValueDictionary[StyleKey, Style]' = weakref.WeakValueDictionary()
+_intern_counters = [0, 0]  # hits, misses
+
+
+class InternStats(NamedTuple):
+    hits: int
+    misses: int
+    size: int
+
+
+def intern_stats() -> InternStats:
+    hits, misses = _intern_counters
+    return InternStats(hits, misses, len(_interned_styles))
+
+
+def intern_style(style: BackendStyle) -> Style:
+    if type(style) is Style:
+        return style
+
+    key = make_style_key(style)
+    try:
+        result = _interned_styles[key]
+        _intern_counters[0] += 1
+        return result
+    except KeyError:
+        pass
+
+    _intern_counters[1] += 1
+    result = _interned_styles[key] = Style(style, key)
+    return result
+
+
+def style_key(style: BackendStyle) -> Hashable:
+    if type(style) is Style:
+        return style.key
+    return make_style_key(style)
+
+
 RuleValue = Callable[[str, PropsT], KeysT]
 NodeRuleValue = RuleValue[NodeProps, NodeKeys]
 EdgeRuleValue = RuleValue[EdgeProps, EdgeKeys]
@@ -56,49 +194,139 @@ class rule(Generic[PropsT, KeysT]):
     has_value: bool = True
 
 
-def merge_drawio_style(old: BackendStyle, new: BackendStyle) -> BackendStyle:
-    result = old.copy()
+NodeRule = rule[NodeProps, NodeKeys]
+EdgeRule = rule[EdgeProps, EdgeKeys]
+
+
+def merge_drawio_style(old: BackendStyle, new: BackendStyle) -> StyleDict:
+    result = dict(old)
     if '@pop' in new:
-        new = new.copy()
-        todelete: list[str] = new.pop('@pop')  # type: ignore[assignment]
+        todelete: list[str] = new['@pop']  # type: ignore[assignment]
         for it in todelete:
             result.pop(it, None)
-    result.update(new)
+        result.update((k, v) for k, v in new.items() if k != '@pop')
+    else:
+        result.update(new)
     return result
 
 
+def split_classes(classes: ClassList) -> list[str]:
+    if type(classes) is str:
+        return [it.strip() for it in classes.split()]
+    return classes  # type: ignore[return-value]
+
+
 EvalPropsFn = Callable[[PropsT], PropsT]
+MergePropsFn = Callable[[PropsT, KeysT, Style], PropsT]
+
+# (id of base props, class names)
+ClassesKey = tuple[int, tuple[str, ...]]
+# (id of edge props, start port classes, end port classes)
+PortsKey = tuple[int, tuple[str, ...], tuple[str, ...]]
 
 
 class StyleMap(Generic[PropsT, KeysT]):
     _styles: dict[str, KeysT]
     _rules: list[rule[PropsT, KeysT]]
-    _rules_re: re.Pattern[str]
+    # rules with values by prefix, built from pending rules on first lookup
     _rules_map: dict[str, rule[PropsT, KeysT]]
+    _pending_rules: list[rule[PropsT, KeysT]]
+    # deferred registration of styles and rules, run on first use
+    _loaders: list[Callable[[], None]]
     _default_props: PropsT
     _eval_fn: EvalPropsFn[PropsT] | None
+    _merge_fn: MergePropsFn[PropsT, KeysT] | None
 
     def __init__(
-        self, default_props: PropsT, *, eval_fn: EvalPropsFn[PropsT] | None = None
+        self,
+        default_props: PropsT,
+        *,
+        eval_fn: EvalPropsFn[PropsT] | None = None,
+        merge_fn: MergePropsFn[PropsT, KeysT] | None = None,
+        rule_cache_size: int = RULE_CACHE_SIZE,
+        classes_cache_size: int = CLASSES_CACHE_SIZE,
+        eval_cache_size: int = EVAL_CACHE_SIZE,
+        ports_cache_size: int = PORTS_CACHE_SIZE,
     ) -> None:
         self._styles = {}
         self._rules = []
-        self._rule_cache: dict[str, tuple[RuleValue[PropsT, KeysT], str]] = {}
-        self._process_rules()
+        self._rules_map = {}
+        self._pending_rules = []
+        self._loaders = []
+        self._rule_cache: LRUCache[str, tuple[RuleValue[PropsT, KeysT], str]] = LRUCache(
+            rule_cache_size
+        )
+        # bumped on every change of styles or rules
+        self.generation = 0
+        # base props are kept in values, so ids in keys can't be reused
+        self._classes_cache: LRUCache[ClassesKey, tuple[PropsT, PropsT]] = LRUCache(
+            classes_cache_size
+        )
+        # evaluated props by source props id, shared by all nodes or edges
+        self._eval_cache: LRUCache[int, tuple[PropsT, PropsT]] = LRUCache(eval_cache_size)
+        # evaluated props with port classes applied, source props kept as in classes cache
+        self._ports_cache: LRUCache[PortsKey, tuple[PropsT, PropsT]] = LRUCache(ports_cache_size)
         self._default_props = default_props
         self._eval_fn = eval_fn
+        self._merge_fn = merge_fn
+
+    def cache_stats(self) -> dict[str, CacheStats]:
+        return {
+            'rules': self._rule_cache.stats,
+            'classes': self._classes_cache.stats,
+            'evaluated': self._eval_cache.stats,
+            'ports': self._ports_cache.stats,
+        }
+
+    def resize_caches(
+        self,
+        rules: int | None = None,
+        classes: int | None = None,
+        evaluated: int | None = None,
+        ports: int | None = None,
+    ) -> None:
+        if rules is not None:
+            self._rule_cache.resize(rules)
+        if classes is not None:
+            self._classes_cache.resize(classes)
+        if evaluated is not None:
+            self._eval_cache.resize(evaluated)
+        if ports is not None:
+            self._ports_cache.resize(ports)
+
+    def defer(self, loader: Callable[[], None]) -> None:
+        self._loaders.append(loader)
+
+    @property
+    def has_deferred(self) -> bool:
+        return bool(self._loaders)
+
+    def _load(self) -> None:
+        loaders, self._loaders = self._loaders, []
+        for it in loaders:
+            it()
 
     def update(self, styles: Mapping[str, KeysT]) -> None:
+        if self._loaders:
+            # queued after pending loaders to keep registration order
+            self._loaders.append(partial(self.update, dict(styles)))
+            return
         self._styles.update(styles)
+        self._classes_cache.clear()
+        self._ports_cache.clear()
+        self.generation += 1
 
     def add_rules(self, rules: Iterable[rule[PropsT, KeysT]]) -> None:
+        rules = list(rules)
+        if self._loaders:
+            self._loaders.append(partial(self.add_rules, rules))
+            return
         self._rules.extend(rules)
-        self._process_rules()
-
-    def _process_rules(self) -> None:
-        vparts = [it.prefix for it in self._rules if it.has_value]
-        self._rules_re = re.compile(rf'({"|".join(vparts)})-(.+)')
-        self._rules_map = {it.prefix: it for it in self._rules}
+        self._pending_rules.extend(it for it in rules if it.has_value)
+        self._rule_cache.clear()
+        self._classes_cache.clear()
+        self._ports_cache.clear()
+        self.generation += 1
 
     def _rule_value(self, cls: str) -> tuple[RuleValue[PropsT, KeysT], str] | None:
         try:
@@ -106,62 +334,112 @@ class StyleMap(Generic[PropsT, KeysT]):
         except KeyError:
             pass
 
-        m = self._rules_re.match(cls)
-        if not m:
-            return None
+        if self._pending_rules:
+            self._rules_map.update((it.prefix, it) for it in self._pending_rules)
+            self._pending_rules = []
 
-        prefix, value = m.group(1, 2)
-        result = self._rule_cache[cls] = self._rules_map[prefix].fn, value
-        return result
+        # longest prefix ending at `-` separator with non-empty value
+        end = len(cls) - 1
+        while (end := cls.rfind('-', 0, end)) > 0:
+            if r := self._rules_map.get(cls[:end]):
+                result = self._rule_cache[cls] = r.fn, cls[end + 1 :]
+                return result
+
+        return None
+
+    def resolve_classes(self, classes: ClassList, result: PropsT | None = None) -> PropsT:
+        classes = split_classes(classes)
+        base = self._default_props if result is None else result
+        key = id(base), tuple(classes)
+        try:
+            cached_base, resolved = self._classes_cache[key]
+            if cached_base is base:
+                return resolved
+        except KeyError:
+            pass
 
-    def resolve_classes(
-        self, classes: ClassList, result: PropsT | None = None, inplace: bool = False
-    ) -> PropsT:
-        if result is None:
-            result = self.default_props()
-        elif not inplace:
-            result = replace(result)
+        resolved = self._resolve_classes(classes, base)
+        self._classes_cache[key] = base, resolved
+        return resolved
 
-        if type(classes) is str:
-            classes = [it.strip() for it in classes.split()]
+    def _resolve_classes(self, classes: Iterable[str], result: PropsT) -> PropsT:
+        if self._loaders:
+            self._load()
 
         for it in classes:
             if it in self._styles:
-                self.resolve_props((self._styles[it],), result, inplace=True)
+                result = self._resolve_props((self._styles[it],), result)
             else:
                 match = self._rule_value(it)
                 if match:
-                    self.merge(result, match[0](match[1], result))
+                    result = self.merge(result, match[0](match[1], result))
                 else:
                     raise ValueError(f'Unknown class or rule: {it}')
 
         return result
 
-    def merge(self, result: PropsT, data: KeysT) -> None:
-        drawio_style = merge_drawio_style(result.drawio_style, get_style(data.get('drawio_style')))
-        vars(result).update(data, drawio_style=drawio_style)
+    def merge(self, result: PropsT, data: KeysT) -> PropsT:
+        drawio_style = intern_style(
+            merge_drawio_style(result.drawio_style, get_style(data.get('drawio_style')))
+        )
+        if self._merge_fn:
+            return self._merge_fn(result, data, drawio_style)
+
+        changes: dict[str, Any] = {k: v for k, v in data.items() if k != 'classes'}
+        changes['drawio_style'] = drawio_style
+        return replace(result, **changes)
+
+    def resolve_props(self, props: Iterable[KeysT], result: PropsT | None = None) -> PropsT:
+        return self._resolve_props(props, self._default_props if result is None else result)
 
-    def resolve_props(
-        self, props: Iterable[KeysT], result: PropsT | None = None, inplace: bool = False
-    ) -> PropsT:
-        if result is None:
-            result = self.default_props()
-        elif not inplace:
-            result = replace(result)
+    def _resolve_props(self, props: Iterable[KeysT], result: PropsT) -> PropsT:
+        if self._loaders:
+            self._load()
 
         for p in props:
             classes: ClassList
             if classes := p.get('classes'):  # type: ignore[assignment]
-                self.resolve_classes(classes, result, inplace=True)
-            self.merge(result, p)
+                result = self._resolve_classes(split_classes(classes), result)
+            result = self.merge(result, p)
 
         return result
 
     def default_props(self) -> PropsT:
-        return replace(self._default_props)
+        return self._default_props
 
     def eval_props(self, props: PropsT) -> PropsT:
-        return self._eval_fn(props) if self._eval_fn else props
+        if not self._eval_fn:
+            return props
+
+        try:
+            source, result = self._eval_cache[id(props)]
+            if source is props:
+                return result
+        except KeyError:
+            pass
+
+        result = self._eval_fn(props)
+        self._eval_cache[id(props)] = props, result
+        return result
+
+    def resolve_ports(self, props: PropsT, start: tuple[str, ...], end: tuple[str, ...]) -> PropsT:
+        # evaluated edge props with `start-` and `end-` prefixed port classes
+        key = id(props), start, end
+        try:
+            source, result = self._ports_cache[key]
+            if source is props:
+                return result
+        except KeyError:
+            pass
+
+        result = props
+        if start:
+            result = self.resolve_classes(['start-' + it for it in start], result)
+        if end:
+            result = self.resolve_classes(['end-' + it for it in end], result)
+        result = self.eval_props(result)
+        self._ports_cache[key] = props, result
+        return result
 
 
 NodeStyleMap = StyleMap[NodeProps, NodeKeys]
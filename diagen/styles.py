@@ -1,17 +1,22 @@
+import marshal
 from dataclasses import replace
-from typing import Iterable, Literal, TypeVar, overload
+from typing import Iterable, Literal, Sequence, TypeVar, overload
 
 from .layouts.grid import GridLayout
+from .props import eval_node_props, merge_edge_props, merge_node_props
 from .stylemap import (
     BackendStyle,
     EdgeKeys,
     EdgeProps,
+    EdgeRule,
     EdgeRuleValue,
     NodeKeys,
     NodeProps,
     NodeRuleValue,
     Span,
+    StyleDict,
     StyleMap,
+    intern_style,
     rule,
 )
 from .utils import kebab_case, mux2
@@ -19,16 +24,15 @@ from .utils import kebab_case, mux2
 AlignLiteral = TypeVar('AlignLiteral', Literal['align'], Literal['items_align'])
 
 
-def default_label_formatter(props: NodeProps | EdgeProps, label: list[str]) -> str:
+def default_label_formatter(props: NodeProps | EdgeProps, label: Sequence[str]) -> str:
     return '\n'.join(label)
 
 
 def set_at(name: Literal['padding', 'size', 'gap'], *pos: int) -> NodeRuleValue:
     def inner(value: str, current: NodeProps) -> NodeKeys:
-        dyn: NodeKeys = vars(current)  # type: ignore[assignment]
         v = float(value)
         if pos:
-            result = list(dyn[name])
+            result = list(getattr(current, name))
             for p in pos:
                 result[p] = v
             return {name: tuple(result)}  # type: ignore[misc]
@@ -38,24 +42,6 @@ def set_at(name: Literal['padding', 'size', 'gap'], *pos: int) -> NodeRuleValue:
     return inner
 
 
-def eval_node_props(props: NodeProps) -> NodeProps:
-    m = props.scale
-    s = props.size
-    g = props.gap
-    p = props.padding
-    return replace(
-        props,
-        size=(s[0] * m if s[0] is not None else None, s[1] * m if s[1] is not None else None),
-        gap=(g[0] * m, g[1] * m),
-        padding=(
-            p[0] * m,
-            p[1] * m,
-            p[2] * m,
-            p[3] * m,
-        ),
-    )
-
-
 def parse_grid_range(value: str, current: Span) -> Span:
     if '+' in value:
         h, sep, t = value.partition('+')
@@ -123,7 +109,6 @@ def set_grid_span(value: str, current: NodeProps) -> NodeKeys:
 
 def set_align(name: AlignLiteral, pos: int) -> NodeRuleValue:
     def inner(value: str, current: NodeProps) -> NodeKeys:
-        dyn: NodeKeys = vars(current)  # type: ignore[assignment]
         if value == 'start':
             v = -1.0
         elif value == 'center':
@@ -133,7 +118,7 @@ def set_align(name: AlignLiteral, pos: int) -> NodeRuleValue:
         else:
             v = float(value) / 50 - 1
 
-        return {name: mux2(pos, v, dyn[name])}
+        return {name: mux2(pos, v, getattr(current, name))}
 
     return inner
 
@@ -189,7 +174,7 @@ def set_dashed(value: str, current: NodeProps | EdgeProps) -> NodeKeys | EdgeKey
 def set_shadow(value: str, current: EdgeProps) -> EdgeKeys:
     h, _, t = value.partition('/')
 
-    style: BackendStyle = {
+    style: StyleDict = {
         'shadow': 1,
         'shadowBlur': h,
     }
@@ -258,7 +243,7 @@ node = StyleMap[NodeProps, NodeKeys](
         scale=4.0,
         virtual=False,
         link=None,
-        drawio_style={},
+        drawio_style=intern_style({}),
         label_formatter=default_label_formatter,
         items_align=(0, 0),
         align=(None, None),
@@ -267,6 +252,7 @@ node = StyleMap[NodeProps, NodeKeys](
         grid_cell=(Span(), Span()),
     ),
     eval_fn=eval_node_props,
+    merge_fn=merge_node_props,
 )
 
 node.update(
@@ -320,37 +306,35 @@ def eval_edge_props(props: EdgeProps) -> EdgeProps:
     m = props.scale
     lo = props.label_offset
 
-    drawio_style: BackendStyle = {}
+    style: StyleDict = {}
     if props.arc_size is not None:
-        drawio_style['arcSize'] = m * props.arc_size
+        style['arcSize'] = m * props.arc_size
 
     if props.spacing_both is not None:
-        drawio_style['perimeterSpacing'] = m * props.spacing_both
+        style['perimeterSpacing'] = m * props.spacing_both
 
     if props.spacing[0] is not None:
-        drawio_style['sourcePerimeterSpacing'] = m * props.spacing[0]
+        style['sourcePerimeterSpacing'] = m * props.spacing[0]
 
     if props.spacing[1] is not None:
-        drawio_style['targetPerimeterSpacing'] = m * props.spacing[1]
+        style['targetPerimeterSpacing'] = m * props.spacing[1]
 
     if props.jump_size is not None:
-        drawio_style['jumpSize'] = m * props.jump_size
+        style['jumpSize'] = m * props.jump_size
 
-    if drawio_style:
-        drawio_style.update(props.drawio_style)
-    else:
-        drawio_style = props.drawio_style
+    drawio_style = props.drawio_style
+    if style:
+        style.update(drawio_style)
+        drawio_style = intern_style(style)
 
-    return replace(
-        props, label_offset=(lo[0], lo[1] * m), drawio_style=drawio_style or props.drawio_style
-    )
+    return replace(props, label_offset=(lo[0], lo[1] * m), drawio_style=drawio_style)
 
 
 edge = StyleMap[EdgeProps, EdgeKeys](
     EdgeProps(
         scale=4.0,
         arc_size=None,
-        drawio_style={},
+        drawio_style=intern_style({}),
         label_formatter=default_label_formatter,
         label_offset=(0, 0),
         spacing=(None, None),
@@ -358,6 +342,7 @@ edge = StyleMap[EdgeProps, EdgeKeys](
         jump_size=None,
     ),
     eval_fn=eval_edge_props,
+    merge_fn=merge_edge_props,
 )
 
 EDGE_CURVE_TYPES = ['rounded', 'curved']
@@ -395,11 +380,11 @@ JUMP_TYPES = 'none', 'arc', 'gap', 'line', 'sharp'
 
 def cstyle(conflict_keys: list[str], **style: int | str) -> BackendStyle:
     style['@pop'] = conflict_keys  # type: ignore[assignment]
-    return style  # type: ignore[return-value]
+    return style
 
 
-edge.update(
-    {
+def edge_classes() -> dict[str, EdgeKeys]:
+    return {
         # Edge styles
         'edge-style-none': {'drawio_style': {'@pop': ['edgeStyle']}},
         'elbow': {'drawio_style': 'edgeStyle=elbowEdgeStyle'},
@@ -430,10 +415,10 @@ edge.update(
         'shape-wire': {'drawio_style': {'shape': 'wire', 'fillColor': 'default', 'dashed': 1}},
         **{f'jump-{it}': {'drawio_style': {'jumpStyle': it}} for it in JUMP_TYPES},
     }
-)
 
-edge.add_rules(
-    [
+
+def edge_rules() -> list[EdgeRule]:
+    return [
         rule('label', set_edge_label_offset),
         rule(
             'rounded',
@@ -459,29 +444,73 @@ edge.add_rules(
         rule('space', set_edge_spacing),
         *[rule(f'jump-{it}', set_edge_jump(it)) for it in JUMP_TYPES],
     ]
-)
 
 
-def add_arrow_styles(arrows: Iterable[str]) -> None:
+def arrow_classes(arrows: Iterable[str]) -> dict[str, EdgeKeys]:
     classes: dict[str, EdgeKeys] = {}
-    rules = []
-
     for class_prefix, style_prefix in ('start-', 'start'), ('end-', 'end'):
         for name in arrows:
-            kc_name = kebab_case(name)
-            classes[class_prefix + kc_name] = {'drawio_style': {style_prefix + 'Arrow': name}}
-            rules.append(rule(class_prefix + kc_name, set_edge_arrow_shape(style_prefix, name)))
-
+            classes[class_prefix + kebab_case(name)] = {
+                'drawio_style': {style_prefix + 'Arrow': name}
+            }
         classes[class_prefix + 'fill'] = {'drawio_style': {style_prefix + 'Fill': 1}}
         classes[class_prefix + 'fill-none'] = {'drawio_style': {style_prefix + 'Fill': 0}}
+    return classes
+
+
+def arrow_rules(arrows: Iterable[str]) -> list[EdgeRule]:
+    rules: list[EdgeRule] = []
+    for class_prefix, style_prefix in ('start-', 'start'), ('end-', 'end'):
+        for name in arrows:
+            rules.append(
+                rule(class_prefix + kebab_case(name), set_edge_arrow_shape(style_prefix, name))
+            )
         rules.append(rule(class_prefix + 'fill', set_edge_end_fill(style_prefix)))
         rules.append(rule(class_prefix + 'size', set_edge_end_size(style_prefix)))
 
     for class_prefix, style_prefix, end in ('start-', 'source', 0), ('end-', 'target', 1):
         rules.append(rule(class_prefix + 'space', set_edge_end_spacing(style_prefix, end)))
 
-    edge.update(classes)
-    edge.add_rules(rules)
+    return rules
+
+
+def add_arrow_styles(arrows: Iterable[str]) -> None:
+    arrows = list(arrows)
+    edge.update(arrow_classes(arrows))
+    edge.add_rules(arrow_rules(arrows))
+
+
+SNAPSHOT_VERSION = 1
+
+# built-in edge class table loaded from a snapshot
+_snapshot: dict[str, EdgeKeys] | None = None
+_edge_styles_loaded = False
+
+
+def builtin_edge_classes() -> dict[str, EdgeKeys]:
+    return edge_classes() | arrow_classes(ARROW_TYPES)
+
+
+def dump_snapshot() -> bytes:
+    return marshal.dumps((SNAPSHOT_VERSION, builtin_edge_classes()))
+
+
+def load_snapshot(data: bytes) -> None:
+    # must be called before the first use of edge styles
+    global _snapshot
+    version, classes = marshal.loads(data)
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f'Unsupported style snapshot version: {version}')
+    if _edge_styles_loaded:
+        raise RuntimeError('Edge styles are already loaded, snapshot must be loaded before use')
+    _snapshot = classes
+
+
+def load_edge_styles() -> None:
+    global _edge_styles_loaded
+    _edge_styles_loaded = True
+    edge.update(_snapshot if _snapshot is not None else builtin_edge_classes())
+    edge.add_rules(edge_rules() + arrow_rules(ARROW_TYPES))
 
 
-add_arrow_styles(ARROW_TYPES)
+edge.defer(load_edge_styles)
@@ -1,7 +1,10 @@
 import re
-from typing import TypeVar
+from collections import OrderedDict
+from typing import Generic, Hashable, NamedTuple, TypeVar
 
 T = TypeVar('T')
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
 
 
 def dtup2(direction: int, v1: T, v2: T) -> tuple[T, T]:
@@ -30,3 +33,54 @@ def _replace(match: re.Match[str]) -> str:
 
 def kebab_case(string: str) -> str:
     return capital_re.sub(_replace, string).lstrip('-')
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    maxsize: int
+
+
+class LRUCache(Generic[K, V]):
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.data: OrderedDict[K, V] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getitem__(self, key: K) -> V:
+        try:
+            value = self.data[key]
+        except KeyError:
+            self.misses += 1
+            raise
+        self.hits += 1
+        self.data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key: K, value: V) -> None:
+        self.data[key] = value
+        self.data.move_to_end(key)
+        self._evict()
+
+    def _evict(self) -> None:
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._evict()
+
+    @property
+    def stats(self) -> CacheStats:
+        return CacheStats(self.hits, self.misses, self.evictions, len(self.data), self.maxsize)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def clear(self) -> None:
+        self.data.clear()
@@ -5,6 +5,10 @@ from diagen import styles
 
 __all__ = ['MockerFixture']
 
+# deferred edge styles are loaded once here, not inside a test whose style
+# changes are rolled back
+styles.edge.resolve_classes('ortho')
+
 
 @pytest.fixture(autouse=True)
 def reset_stylemaps(mocker: MockerFixture) -> None:
@@ -1,9 +1,21 @@
+import base64
+import io
+import xml.etree.ElementTree as ET
+from dataclasses import replace
 from typing import Iterator
+from urllib import parse
 
 import pytest
 
-from diagen import drawio, grid, node_context, vgrid, wrap
+from diagen import drawio, edge, grid, node, node_context, vgrid, wrap
+from diagen.layouts import arrange as arrange_layout
+from diagen.layouts import layout_tree
+from diagen.layouts.grid import GridLayout
+from diagen.nodes import Node
 from diagen.shapes import c4
+from diagen.stylemap import BackendStyle, Style
+
+from .conftest import MockerFixture
 
 
 @pytest.fixture
@@ -92,3 +104,343 @@ def test_subgrids(render: None) -> None:
                 c4.Component('(3, 3)')
                 c4.Component['at-2/2']('(4, 4)')
         c4.Component('(5, 2)')
+
+
+def make_sample() -> Node:
+    with node_context() as nodes:
+        with grid['gap-8']:
+            a = c4.Container('A & <B>', 'quoted "tech"')
+            b = c4.Storage('multi\nline\tlabel')
+        c4.edge(a.r, b.l[0.3], 'uses')
+    return wrap(nodes)
+
+
+def test_streaming_render_matches_element_tree() -> None:
+    root = make_sample()
+    expected = ET.tostring(drawio.to_element_tree(drawio.JGraph.make(root)), encoding='utf-8')
+    assert ''.join(drawio.iter_model(root)).encode() == expected
+
+
+def test_render_to() -> None:
+    root = make_sample()
+    for compress in (False, True):
+        buf = io.BytesIO()
+        written = drawio.render_to(root, buf, compress)
+        assert written == len(buf.getvalue())
+        assert buf.getvalue().decode() == drawio.render(root, compress)
+
+    chunks = list(drawio.iter_render(root, compress=False, chunk_size=64))
+    assert len(chunks) > 3
+    assert b''.join(chunks).decode() == drawio.render(root, compress=False)
+
+
+def test_streaming_encode_decode() -> None:
+    text = ''.join(f'<mxCell value="{i} Привет & + 100%" />' for i in range(500))
+    data = text.encode()
+    chunks = [data[i : i + 7] for i in range(0, len(data), 7)]
+
+    encoded = b''.join(drawio.encode_chunks(chunks, level=9))
+    assert encoded == base64.b64encode(drawio.raw_deflate(parse.quote(data).encode(), 9))
+    assert drawio.decode(encoded) == text
+
+    parts = list(drawio.decode_chunks(encoded[i : i + 5] for i in range(0, len(encoded), 5)))
+    assert len(parts) > 1
+    assert ''.join(parts) == text
+
+    root = make_sample()
+    fast = drawio.render(root, level=1)
+    best = drawio.render(root, level=9)
+    payload = fast.split('>')[2].split('<')[0]
+    assert drawio.decode(payload.encode()) == ''.join(drawio.iter_model(root))
+    assert len(best) <= len(fast)
+
+
+def test_port_anchors() -> None:
+    with node_context() as nodes:
+        with grid:
+            a = c4.Container('A')
+            b = c4.Container('B')
+        edge(a.b[0.25], b.t, 'one')
+        edge(a.r, b.l[1], 'two')
+    root = wrap(nodes)
+
+    model = drawio.JGraph.make(root, drawio.RenderOptions(ports='anchor'))
+    cells = model.children[0].children
+    assert len(cells) == 2 + 2 + 2
+
+    styles = {
+        it.attrs['value']: dict(p.split('=') for p in it.attrs['style'].split(';'))
+        for it in cells
+        if it.attrs.get('edge')
+    }
+    assert styles['one']['exitX'] == '0.25'
+    assert styles['one']['exitY'] == '1.0'
+    assert styles['one']['entryX'] == '0.5'
+    assert styles['one']['entryY'] == '0.0'
+    assert styles['two']['exitX'] == '1.0'
+    assert styles['two']['entryX'] == '0.0'
+    assert styles['two']['entryY'] == str(2 / 3)
+
+    assert len(drawio.JGraph.make(root).children[0].children) == 2 + 2 + 2 + 4
+
+
+def test_compact_profile() -> None:
+    with node_context() as nodes:
+        with grid['gap-8.4']:
+            for i in range(40):
+                node['w-10.03 h-5'](f'C{i}')
+    root = wrap(nodes)
+
+    full = drawio.render(root, compress=False)
+    compact = drawio.render(root, compress=False, options=drawio.COMPACT_OPTIONS)
+    assert len(compact) < len(full) * 0.75
+    assert len(drawio.render(root, options=drawio.COMPACT_OPTIONS)) < len(drawio.render(root))
+
+    model = drawio.JGraph.make(root, drawio.COMPACT_OPTIONS)
+    attrs = model.attrs
+    assert attrs == {'fold': '0', 'pageWidth': '2915.2', 'pageHeight': '20'}
+
+    cells = model.children[0].children
+    assert [it.attrs['id'] for it in cells[:4]] == ['0', '1', '15', '14']
+    assert cells[-1].attrs['id'] == '2'
+    assert cells[-1].children[0].attrs == {'as': 'geometry', 'width': '40.1', 'height': '20'}
+
+    options = drawio.RenderOptions(compact=True, snap=True, grid_size=20)
+    cells = drawio.JGraph.make(root, options).children[0].children
+    xs = [float(it.children[0].attrs.get('x', 0)) for it in cells[2:]]
+    assert all(x % 20 == 0 for x in xs)
+
+
+def test_compact_style() -> None:
+    assert (
+        drawio.compact_style_to_str({'a': 1, 'dashed': 0, 'shadow': '1', 'b': ''}) == 'a=1;shadow=1'
+    )
+    assert drawio.base36(0) == '0'
+    assert drawio.base36(36 * 36 + 35) == '10z'
+
+
+def make_pipeline(extra: bool = False) -> Node:
+    with node_context() as nodes:
+        with grid['gap-8']:
+            items = [c4.Container(f'Stage {i}') for i in range(5)]
+            if extra:
+                c4.Container('Extra')
+            c4.Container('Same')
+            c4.Container('Same')
+        for s, t in zip(items, items[1:]):
+            c4.edge(s.r, t.l, 'next')
+    return wrap(nodes)
+
+
+def test_stable_ids() -> None:
+    options = drawio.RenderOptions(stable_ids=True)
+    first = drawio.render(make_pipeline(), compress=False, options=options)
+    assert first == drawio.render(make_pipeline(), compress=False, options=options)
+
+    def lines(data: str) -> set[str]:
+        return set(data.replace('<mxCell', '\n<mxCell').splitlines())
+
+    changed = lines(drawio.render(make_pipeline(True), compress=False, options=options))
+    # new cell, shifted page width and trailing Same nodes
+    assert len(changed - lines(first)) == 4
+
+    model = drawio.JGraph.make(make_pipeline(), options)
+    ids = [it.attrs['id'] for it in model.children[0].children]
+    assert len(set(ids)) == len(ids)
+
+
+def test_fragment_cache() -> None:
+    options = drawio.RenderOptions(stable_ids=True)
+    cache = drawio.FragmentCache()
+
+    def build(label: str) -> Node:
+        with node_context() as nodes:
+            with grid['gap-8']:
+                for i in range(3):
+                    with c4.Boundary['dv'](f'B{i}'):
+                        a = c4.Container(label if i == 1 else 'A')
+                        c4.Container('B')
+            c4.edge(a, nodes[0].children[0].children[0])
+        return wrap(nodes)
+
+    expected = drawio.render(build('A'), compress=False, options=options)
+    assert drawio.render(build('A'), compress=False, options=options, cache=cache) == expected
+    assert cache.hits == 0
+
+    cache.misses = 0
+    assert drawio.render(build('A'), compress=False, options=options, cache=cache) == expected
+    assert cache.misses == 0
+
+    cache.hits = 0
+    result = drawio.render(build('Changed'), compress=False, options=options, cache=cache)
+    assert result == drawio.render(build('Changed'), compress=False, options=options)
+    # changed node, its boundary and the top grid, everything else is reused
+    assert cache.misses == 3
+    assert cache.hits == 8
+
+
+def test_render_pages() -> None:
+    pages = [(f'Pipeline {i}', make_pipeline(bool(i % 2))) for i in range(4)]
+
+    result = drawio.render_pages(pages)
+    assert result == drawio.render_pages(pages, workers=2)
+    assert result.count('<diagram ') == 4
+    assert '<diagram id="page-3" name="Pipeline 3">' in result
+
+    plain = drawio.render_pages(pages[:2], compress=False)
+    for name, root in pages[:2]:
+        assert ''.join(drawio.iter_model(root)) in plain
+
+
+def test_interned_styles() -> None:
+    with node_context() as nodes:
+        with grid:
+            items = [c4.Container('Same') for _ in range(10)]
+        edges = [c4.edge(s.r, t.l) for s, t in zip(items, items[1:])]
+    root = wrap(nodes)
+
+    style = items[0].props.drawio_style
+    assert isinstance(style, Style)
+    assert all(it.props.drawio_style is style for it in items)
+    assert all(it.props.drawio_style is edges[0].props.drawio_style for it in edges)
+
+    list(drawio.iter_model(root))
+    assert style.strings['full'] == drawio.style_to_str(dict(style))
+    assert 'compact' not in style.strings
+
+
+def test_load_geometry() -> None:
+    options = drawio.RenderOptions(stable_ids=True)
+    root = make_sample()
+    model = drawio.JGraph.make(root, options)
+    cells = {it.attrs['id']: it for it in model.children[0].children}
+
+    for compress in (True, False):
+        data = drawio.render(root, compress, options=options).encode()
+        index = drawio.load(io.BytesIO(data))
+        assert len(index) == 4
+        for cell_id, geom in index.items():
+            attrs = cells[cell_id].children[0].attrs
+            assert geom.parent == cells[cell_id].attrs['parent']
+            assert (geom.x, geom.y) == (float(attrs['x']), float(attrs['y']))
+            assert (geom.width, geom.height) == (float(attrs['width']), float(attrs['height']))
+
+    pages = drawio.render_pages([('A', make_sample()), ('B', make_pipeline())])
+    # 7 nodes and 8 port vertices
+    assert len(drawio.load(io.BytesIO(pages.encode()), page='B')) == 7 + 8
+
+
+def test_load_clears_skipped_pages(mocker: MockerFixture) -> None:
+    pages = drawio.render_pages([('A', make_sample()), ('B', make_pipeline())], compress=False)
+    cells: list[ET.Element] = []
+    parse = ET.iterparse
+
+    def iterparse(*args: object, **kwargs: object) -> Iterator[tuple[str, ET.Element]]:
+        for event, el in parse(*args, **kwargs):  # type: ignore[call-overload]
+            if el.tag == 'mxCell':
+                cells.append(el)
+            yield event, el
+
+    mocker.patch.object(ET, 'iterparse', iterparse)
+    assert len(drawio.load(io.BytesIO(pages.encode()), page='B')) == 7 + 8
+    assert cells
+    assert all(len(it) == 0 and not it.attrib for it in cells)
+
+
+def test_pinned_render(mocker: MockerFixture) -> None:
+    options = drawio.RenderOptions(stable_ids=True)
+    data = drawio.render(make_pipeline(), options=options)
+    index = drawio.load(io.BytesIO(data.encode()))
+
+    pinned = drawio.RenderOptions(stable_ids=True, pinned=index)
+    arrange = mocker.spy(GridLayout, 'arrange')
+    assert drawio.render(make_pipeline(), options=pinned) == data
+    # top level grid is fully pinned and is not arranged
+    assert arrange.call_count == 1
+
+    # hand edit: move a node and make it bigger
+    root = make_pipeline()
+    moved = root.children[0].children[2]
+    cell_id = drawio.JGraph(layout_tree(root), options).ids[moved]
+    index[cell_id] = replace(index[cell_id], x=500, y=300, width=10)
+    layout = drawio.JGraph(arrange_layout(root, drawio.make_pins(root, index, options)), options)
+    assert layout.node_map[moved].position == (500, 300)
+    assert layout.node_map[moved].size == (10, index[cell_id].height)
+
+    model = drawio.JGraph.make(make_pipeline(), replace(pinned, pinned=index))
+    cell = next(it for it in model.children[0].children if it.attrs['id'] == cell_id)
+    assert float(cell.children[0].attrs['width']) == 10
+
+
+def make_rows() -> Node:
+    with node_context() as nodes:
+        with vgrid['gap-20']:
+            rows = []
+            for r in range(3):
+                with grid['gap-8']:
+                    rows.append([node(f'n{r}{i}') for i in range(3)])
+        for row in rows:
+            edge(row[0], row[1])
+        edge(rows[0][2], rows[1][2])
+        edge(rows[1][0].b, rows[2][0].t)
+    return wrap(nodes)
+
+
+def test_render_tiles() -> None:
+    root = make_rows()
+    result = drawio.render_tiles(root, compress=False)
+    assert result == drawio.render_tiles(make_rows(), compress=False)
+
+    mxfile = ET.fromstring(result)
+    pages = mxfile.findall('diagram')
+    assert [it.get('name') for it in pages] == ['Page-1', 'Page-2', 'Page-3']
+
+    def vertices(page: ET.Element) -> dict[str, ET.Element]:
+        return {it.get('value', ''): it for it in page.iter('mxCell') if it.get('vertex')}
+
+    first, second, third = map(vertices, pages)
+    assert sorted(first) == ['Page-2', 'n00', 'n01', 'n02']
+    assert sorted(second) == ['Page-1', 'Page-3', 'n10', 'n11', 'n12']
+    assert first['Page-2'].get('link') == 'data:page/id,page-1'
+
+    # tiles are shifted to the page origin
+    geom = second['n10'].find('mxGeometry')
+    assert geom is not None and geom.get('y') == '0.0'
+    model = pages[1].find('mxGraphModel')
+    assert model is not None and model.get('pageHeight') == '48.0'
+
+    # cross page edge ends at a stub and keeps port constraints
+    stub = second['Page-3']
+    cross = [it for it in pages[1].iter('mxCell') if it.get('target') == stub.get('id')]
+    assert len(cross) == 1
+    assert 'sourcePortConstraint=south' in (cross[0].get('style') or '')
+
+    columns = drawio.render_tiles(root, compress=False, tile_size=(100, 1000))
+    assert ET.fromstring(columns).findall('diagram')[2].get('name') == 'Page-3'
+
+    compressed = drawio.render_tiles(root)
+    assert compressed == drawio.render_tiles(root, workers=2)
+    for page, plain in zip(ET.fromstring(compressed).findall('diagram'), pages):
+        model = plain.find('mxGraphModel')
+        assert model is not None
+        assert drawio.decode((page.text or '').encode()) == ET.tostring(model, 'unicode')
+
+
+def test_render_themes() -> None:
+    dark = drawio.Theme('dark', {'fillColor': {'#ffffff': '#1e1e1e'}, '*': {'#23A2D9': '#5a9bd5'}})
+    assert dark.apply({'fillColor': '#ffffff', 'strokeColor': '#23A2D9', 'rounded': 1}) == {
+        'fillColor': '#1e1e1e',
+        'strokeColor': '#5a9bd5',
+        'rounded': 1,
+    }
+    style: BackendStyle = {'fillColor': '#000'}
+    assert dark.apply(style) is style
+
+    light = drawio.Theme('light', {})
+    result = drawio.render_themes(make_pipeline(), [light, dark], compress=False)
+    assert result['light'] == drawio.render(make_pipeline(), compress=False)
+    assert '#23A2D9' in result['light']
+    assert '#23A2D9' not in result['dark']
+    assert 'fillColor=#5a9bd5' in result['dark']
+    assert dark.strings
+    assert set(c4.Container().props.drawio_style.strings) == {'full'}
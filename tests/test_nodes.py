@@ -1,4 +1,11 @@
-from diagen import edge, node, node_context
+import gc
+import weakref
+
+import pytest
+
+from diagen import Diagram, drawio, edge, grid, node, node_context, styles, wrap
+from diagen.layouts import arrange
+from diagen.stylemap import BackendStyle
 
 
 def type_check_edge_factory_invalid_signature() -> None:
@@ -19,7 +26,7 @@ def test_node_factory_signatures() -> None:
 
     n = node(props={'scale': 10})
     assert n.props.scale == 10
-    assert n.children == []
+    assert not n.children
 
     n = node(c := node(), props={'scale': 10})
     assert n.props.scale == 10
@@ -100,3 +107,135 @@ def test_isolated_function_should_not_populate_parent_nodes() -> None:
         fn()
 
     assert not s.children
+
+
+def test_derived_factory_cache() -> None:
+    assert edge['label-40/12'] is edge['label-40/12']
+    assert node['p-1 gap-2'] is not node[['p-1', 'gap-2']]
+    assert node[['p-1', 'gap-2']] is node[['p-1', 'gap-2']]
+    assert node.props(scale=2) is node.props(scale=2)
+
+    style: BackendStyle = {'fillColor': 'red'}
+    assert node.props(drawio_style=style) is not node.props(drawio_style=style)
+
+    styles.node.update({'cache-test': {'gap': (1, 1)}})
+    factory = node['cache-test']
+    assert node['cache-test'] is factory
+    styles.node.update({'cache-test': {'gap': (2, 2)}})
+    assert node['cache-test'] is factory
+    assert factory.factory_props.gap == (2, 2)
+
+
+def test_factory_unknown_class() -> None:
+    with pytest.raises(ValueError, match='Unknown class or rule: no-such-class'):
+        node['no-such-class']
+    with pytest.raises(ValueError, match='Unknown class or rule'):
+        node.props(classes='no-such-class')
+
+
+def test_factory_redefinition() -> None:
+    styles.node.update({'redef-test': {'gap': (1, 1)}})
+    factory = node['redef-test'].props(scale=1)
+    assert factory().props.gap == (1, 1)
+
+    styles.node.update({'redef-test': {'gap': (3, 3)}})
+    assert factory().props.gap == (3, 3)
+    assert factory().props.size == (24, 12)
+
+    props = factory.factory_props
+    assert factory.factory_props is props
+
+
+def test_shared_evaluated_props() -> None:
+    factory = node['p-2']
+    first, second = factory(), factory()
+    assert first.props is second.props
+    assert first.props.padding == (8, 8, 8, 8)
+
+    s, t = node(), node()
+    assert edge(s, t).props is edge(t, s).props
+    assert node(props={'scale': 2}).props is not node(props={'scale': 2}).props
+
+
+def test_port_classes_cache() -> None:
+    s, t = node(), node()
+    first = edge(s.r['circle'], t.l['circle'])
+    second = edge(t.r['circle'], s.l['circle'])
+    assert first.props is second.props
+    assert first.props.drawio_style['startArrow'] == 'circle'
+    assert styles.edge.cache_stats()['ports'].hits >= 1
+
+    assert edge(s.r['circle'], t).props is not first.props
+
+
+def test_compact_nodes() -> None:
+    s, t = node(), node()
+    assert not hasattr(s, '__dict__')
+    assert s.children == () and s.edges == () and s.label == ()
+
+    e = edge(s.r, t.l)
+    assert list(s.edges) == [e]
+    assert t.edges == [e]
+    assert not hasattr(e, '__dict__')
+    assert not hasattr(s.r, '__dict__')
+
+    with node() as p:
+        c = node('child')
+    assert p.children == [c]
+    assert c.label == ['child']
+
+
+def test_diagram_frees_without_gc() -> None:
+    gc.disable()
+    try:
+        with Diagram() as diagram:
+            with grid['subgrid'] as sub:
+                s, t = node('s'), node('t')
+            root = wrap([sub, node('u')])
+            e = edge(s.r, t.l)
+        assert list(s.edges) == [e]
+        assert diagram.edges == [e]
+
+        drawio.render(root)
+        layout = arrange(root)
+        assert s in diagram.positions
+
+        refs = [weakref.ref(it) for it in (s, t, e, root, layout, layout.children[0], diagram)]
+        del s, t, e, sub, root, layout, diagram
+        assert [it() for it in refs] == [None] * len(refs)
+    finally:
+        gc.enable()
+
+
+def test_diagram_reset() -> None:
+    diagram = Diagram()
+    with diagram:
+        s, t = node(), node()
+        edge(s, t)
+    diagram.reset()
+    assert not diagram.edges
+    with pytest.raises(RuntimeError, match='dropped or reset'):
+        list(s.edges)
+
+    with diagram:
+        a, b = node(), node()
+        e = edge(a, b)
+        with pytest.raises(RuntimeError, match='dropped or reset'):
+            edge(s, t)
+    assert diagram.edges == [e]
+    assert list(a.edges) == [e]
+    assert list(b.edges) == [e]
+
+
+def test_dropped_diagram() -> None:
+    with Diagram():
+        a, b = node(), node()
+        edge(a.r, b.l)
+    root = wrap([a, b])
+
+    with pytest.raises(RuntimeError, match='keep the Diagram alive'):
+        list(a.edges)
+    with pytest.raises(RuntimeError):
+        len(a.edge_positions)
+    with pytest.raises(RuntimeError):
+        drawio.render(root)
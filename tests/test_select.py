@@ -0,0 +1,44 @@
+import pytest
+
+from diagen import edge, node, wrap
+from diagen.select import ClassIndex, parse_selector, restyle
+from diagen.shapes import c4
+
+
+def test_class_provenance() -> None:
+    n = node['p-1'].props(classes='gap-2')(props={'classes': 'dv'})
+    assert n.classes == ('size-24/12', 'p-1', 'gap-2', 'dv')
+    assert c4.Storage().classes == ('c4-storage',)
+
+    e = c4.edge['label-60'](n, n)
+    assert e.classes == ('c4-edge', 'label-60')
+
+
+def test_select() -> None:
+    with c4.Boundary('Outer') as outer:
+        cache = c4.Storage('Cache')
+        with c4.Boundary('Inner') as inner:
+            db = c4.Storage('DB')
+            api = c4.Container('API')
+    other = c4.Storage('Other')
+    reads = c4.edge(api, db, 'reads')
+    plain = edge(cache, other)
+
+    index = ClassIndex(wrap([outer, other]))
+    assert index.select('.c4-storage') == [cache, db, other]
+    assert index.select('.c4-boundary .c4-storage') == [cache, db]
+    assert index.select('.c4-boundary > .c4-boundary > node.c4-storage') == [db]
+    assert index.select('.c4-boundary > .c4-storage') == [cache, db]
+    assert index.select('.c4-boundary .c4-boundary edge') == [reads]
+    assert index.select('edge') == [plain, reads]
+    assert index.nodes('.c4-boundary *') == [cache, inner, db, api]
+    assert index.select('.unknown') == []
+
+    with pytest.raises(ValueError):
+        parse_selector('div.c4-storage')
+    assert parse_selector('.size-1.5')[0][1].classes == ('size-1.5',)
+
+    restyle(index.select('.c4-boundary .c4-storage'), 'fillColor=#f00')
+    assert cache.props is db.props
+    assert cache.props.drawio_style['fillColor'] == '#f00'
+    assert other.props.drawio_style['fillColor'] != '#f00'
@@ -0,0 +1,60 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from diagen import styles
+from diagen.shapes import ShapeLibrary, library
+
+
+def test_lazy_library(tmp_path: Path) -> None:
+    path = tmp_path / 'pack.json'
+    path.write_text(
+        json.dumps(
+            {
+                'base': {'classes': 'size-10/10', 'drawio_style': 'html=1'},
+                'nodes': {
+                    'Router': 'shape=router',
+                    'BigBox': {'classes': 'size-20/20', 'drawio_style': 'shape=box'},
+                },
+                'edges': {'Link': 'endArrow=none'},
+            }
+        )
+    )
+
+    lib = ShapeLibrary('pack', str(path))
+    assert 'pack-router' not in styles.node._styles
+
+    router = lib.Router
+    assert 'pack-router' in styles.node._styles
+    assert vars(lib)['Router'] is router
+    assert lib.Router is router
+
+    n = router()
+    assert n.props.size == (40, 40)
+    assert n.props.drawio_style == {'html': '1', 'shape': 'router'}
+    assert lib.BigBox().props.size == (80, 80)
+    assert lib.names() == ['Router', 'BigBox']
+
+    e = lib.edge('Link')(n, n)
+    assert e.props.drawio_style['endArrow'] == 'none'
+
+    with pytest.raises(AttributeError):
+        lib.Switch
+
+
+def test_bad_entry(tmp_path: Path) -> None:
+    path = tmp_path / 'bad.json'
+    path.write_text(json.dumps({'nodes': {'Box': {'size': [10, 10]}}}))
+    with pytest.raises(ValueError, match='Unsupported shape keys: size'):
+        ShapeLibrary('bad', str(path)).Box
+
+
+def test_bundled_library() -> None:
+    from diagen.shapes import network
+
+    assert network is library('network')
+    assert 'Router' in dir(network)
+
+    with pytest.raises(LookupError):
+        library('no-such-pack')
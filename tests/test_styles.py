@@ -1,9 +1,24 @@
+import marshal
+import subprocess
+import sys
+from dataclasses import FrozenInstanceError, replace
 from typing import Unpack
 
 import pytest
 
 from diagen import styles
-from diagen.stylemap import NodeKeys, NodeProps, Span
+from diagen.props import eval_node_props
+from diagen.stylemap import (
+    NodeKeys,
+    NodeProps,
+    Span,
+    StyleMap,
+    get_style,
+    intern_stats,
+    intern_style,
+    rule,
+    style_cache_stats,
+)
 
 resolve_classes = styles.node.resolve_classes
 edge_resolve_classes = styles.edge.resolve_classes
@@ -27,11 +42,24 @@ def test_resolve_is_immutable() -> None:
     styles.node.resolve_props(({'scale': 42},), props)
     assert props.scale == 4
 
-    styles.node.resolve_classes('p-1', props, inplace=True)
-    assert props.padding == (1, 1, 1, 1)
+    with pytest.raises(FrozenInstanceError):
+        props.scale = 42  # type: ignore[misc]
 
-    styles.node.resolve_props(({'scale': 42},), props, inplace=True)
-    assert props.scale == 42
+    with pytest.raises(TypeError):
+        props.drawio_style['shape'] = 'box'  # type: ignore[index]
+
+
+def test_props_are_hashable() -> None:
+    first = edge_resolve_classes('ortho dashed')
+    second = styles.edge.resolve_props(({'classes': 'ortho'}, {'classes': ['dashed']}))
+    assert first is not second
+    assert first == second
+    assert hash(first) == hash(second)
+    assert len({first, second, edge_resolve_classes('ortho')}) == 2
+
+    style = first.drawio_style
+    assert style == dict(style)
+    assert style | {'dashed': 0} == {**style, 'dashed': 0}
 
 
 def test_resolve_classes() -> None:
@@ -65,3 +93,129 @@ def test_edge_style() -> None:
 def test_unknown_rule() -> None:
     with pytest.raises(ValueError, match='Unknown class or rule: unknown'):
         edge_resolve_classes('unknown')
+
+
+def test_resolve_classes_memo() -> None:
+    result = resolve_classes('p-1 px-2')
+    assert resolve_classes(['p-1', 'px-2']) is result
+    assert resolve_classes('p-1', result) is resolve_classes('p-1', result)
+    assert resolve_classes('p-1', result) is not resolve_classes('p-1')
+
+    styles.node.update({'memo-test': {'gap': (1, 1)}})
+    memo = resolve_classes('memo-test')
+    assert memo.gap == (1, 1)
+    styles.node.update({'memo-test': {'gap': (2, 2)}})
+    assert resolve_classes('memo-test').gap == (2, 2)
+
+
+def test_longest_rule_prefix() -> None:
+    result = edge_resolve_classes('end-classic-thin-10 start-open-async-5')
+    assert result.drawio_style['endArrow'] == 'classicThin'
+    assert result.drawio_style['endSize'] == '10'
+    assert result.drawio_style['startArrow'] == 'openAsync'
+
+    assert resolve_classes('grid-cols-3').grid_size == (3, None)
+    assert resolve_classes('items-align-50').items_align[0] == 0
+
+    with pytest.raises(ValueError, match='Unknown class or rule: p-'):
+        resolve_classes('p-')
+
+
+def test_cache_stats() -> None:
+    smap = StyleMap(styles.node.default_props(), rule_cache_size=2)
+    smap.add_rules([rule('p', styles.set_at('padding', 0, 1, 2, 3))])
+    for it in ('p-1', 'p-2', 'p-3', 'p-1'):
+        smap.resolve_classes(it)
+    stats = smap.cache_stats()['rules']
+    assert (stats.misses, stats.evictions, stats.size) == (3, 1, 2)
+    assert smap.cache_stats()['classes'].hits == 1
+
+    get_style('cache-stats=1')
+    before = style_cache_stats()
+    assert get_style('cache-stats=1') == {'cache-stats': '1'}
+    assert style_cache_stats().hits == before.hits + 1
+
+
+def test_interned_styles_are_released() -> None:
+    style = intern_style({'intern-test': '1'})
+    before = intern_stats()
+    assert intern_style({'intern-test': '1'}) is style
+    assert intern_stats().hits == before.hits + 1
+
+    del style
+    intern_style({'intern-test': '1'})
+    assert intern_stats().misses == before.misses + 1
+
+
+def test_generated_merge() -> None:
+    generic = StyleMap[NodeProps, NodeKeys](styles.node.default_props())
+    generic.update(styles.node._styles)
+    generic.add_rules(styles.node._rules)
+
+    for it in ('p-1 px-2 gap-4', 'size-24/12 align-center', 'grid-cols-3 col-2 virtual'):
+        assert generic.resolve_classes(it) == resolve_classes(it)
+
+    props = resolve_classes('p-1 size-24/12')
+    assert eval_node_props(props) == replace(props, size=(96, 48), padding=(4, 4, 4, 4), gap=(0, 0))
+
+
+def test_deferred_loading() -> None:
+    loaded = []
+
+    def loader() -> None:
+        loaded.append(True)
+        smap.update({'deferred': {'gap': (3, 3)}})
+        smap.add_rules([rule('p', styles.set_at('padding', 0, 1, 2, 3))])
+
+    smap = StyleMap(styles.node.default_props())
+    smap.defer(loader)
+    assert not loaded
+
+    assert smap.resolve_classes('deferred p-1').gap == (3, 3)
+    assert loaded == [True]
+    assert smap.resolve_classes('p-2').padding == (2, 2, 2, 2)
+    assert loaded == [True]
+
+
+def test_update_keeps_loading_deferred() -> None:
+    loaded = []
+
+    def loader() -> None:
+        loaded.append(True)
+        smap.update({'deferred': {'gap': (3, 3)}})
+
+    smap = StyleMap(styles.node.default_props())
+    smap.defer(loader)
+    smap.update({'deferred': {'gap': (5, 5)}, 'later': {'scale': 2}})
+    smap.add_rules([rule('p', styles.set_at('padding', 0, 1, 2, 3))])
+    assert not loaded
+
+    assert smap.resolve_classes('deferred later p-1').gap == (5, 5)
+    assert loaded == [True]
+
+
+def test_style_snapshot() -> None:
+    data = styles.dump_snapshot()
+    assert marshal.loads(data)[1] == styles.builtin_edge_classes()
+    edge_resolve_classes('ortho')
+    assert set(styles.builtin_edge_classes()) <= set(styles.edge._styles)
+
+    with pytest.raises(ValueError, match='Unsupported style snapshot version'):
+        styles.load_snapshot(marshal.dumps((0, {})))
+    with pytest.raises(RuntimeError, match='already loaded'):
+        styles.load_snapshot(data)
+
+
+def test_style_snapshot_after_c4() -> None:
+    # module level edge styles of c4 are deferred too, the snapshot is used on first use
+    code = (
+        'import marshal, diagen.shapes.c4\n'
+        'from diagen import styles\n'
+        'classes = styles.builtin_edge_classes()\n'
+        "classes['ortho'] = {'drawio_style': {'edgeStyle': 'snapshot'}}\n"
+        'styles.load_snapshot(marshal.dumps((styles.SNAPSHOT_VERSION, classes)))\n'
+        "props = styles.edge.resolve_classes('c4-edge ortho')\n"
+        "assert props.drawio_style['edgeStyle'] == 'snapshot', props\n"
+        'assert props.label_formatter is diagen.shapes.c4.c4_label_fmt\n'
+    )
+    subprocess.run([sys.executable, '-c', code], check=True)
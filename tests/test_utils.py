@@ -1,5 +1,7 @@
+import pytest
+
 from diagen import styles
-from diagen.utils import kebab_case
+from diagen.utils import CacheStats, LRUCache, kebab_case
 
 
 def test_arrow_classes() -> None:
@@ -31,3 +33,21 @@ def test_arrow_classes() -> None:
         'er-zero-to-many',
         'double-block',
     }
+
+
+def test_lru_cache() -> None:
+    cache = LRUCache[str, int](2)
+    cache['a'] = 1
+    cache['b'] = 2
+    assert cache['a'] == 1
+    cache['c'] = 3
+    assert len(cache) == 2
+    assert 'b' not in cache.data
+    assert cache['a'] == 1
+    assert cache.stats == CacheStats(hits=2, misses=0, evictions=1, size=2, maxsize=2)
+
+    with pytest.raises(KeyError):
+        cache['b']
+    cache.resize(1)
+    assert cache.stats == CacheStats(hits=2, misses=1, evictions=2, size=1, maxsize=1)
+    assert list(cache.data) == ['a']